@@ -1,6 +1,16 @@
 #!/bin/bash
 
 TRAVIOLI_DIR="$(dirname $0)/.."
+
+# Set trace format (csv or bin)
+if [ -z "$TRAVIOLI_TRACE_FORMAT" ]; then
+  export TRAVIOLI_TRACE_FORMAT="csv"
+fi
+if [ "$1" == "--format" ]; then
+  TRAVIOLI_TRACE_FORMAT="$2"
+  shift 2
+fi
+
 JALANGI_DIR="$1"
 
 # Set JS runtime
@@ -9,9 +19,9 @@ if [ -z "$NODEJS" ]; then
 fi
 
 if [ $# -lt 2 ]; then
-  echo "Usage: $0 JALANGI_DIR JS_FILE [ARGS]" >&2
+  echo "Usage: $0 [--format csv|bin] JALANGI_DIR JS_FILE [ARGS]" >&2
   exit 1
 fi
 
 mkdir -p ".travioli"
-"$NODEJS" "$JALANGI_DIR/src/js/commands/jalangi.js" --inlineIID --inlineSource --analysis "$JALANGI_DIR/src/js/sample_analyses/ChainedAnalyses.js" --analysis "$JALANGI_DIR/src/js/runtime/SMemory.js" --analysis "$TRAVIOLI_DIR/src/js/LogData.js" "${@:2}"
+"$NODEJS" "$JALANGI_DIR/src/js/commands/jalangi.js" --inlineIID --inlineSource --initParam "traceFormat:$TRAVIOLI_TRACE_FORMAT" --analysis "$JALANGI_DIR/src/js/sample_analyses/ChainedAnalyses.js" --analysis "$JALANGI_DIR/src/js/runtime/SMemory.js" --analysis "$TRAVIOLI_DIR/src/js/LogData.js" "${@:2}"
@@ -6,9 +6,26 @@ else
   PATTERN="ag_*.dot"
 fi
 
-for ag in $(ls $PATTERN); do
-	echo -n "Rendering access graph: ${ag%%.*}..."
-	dot -Tpng -o "${ag%%.*}.png" "${ag%%.*}.dot"
-	dot -Tpdf -o "${ag%%.*}.pdf" "${ag%%.*}.dot"
-	echo " Done!"
-done
+# Set number of access graphs rendered in parallel
+if [ -z "$TRAVIOLI_JOBS" ]; then
+  export TRAVIOLI_JOBS="$(getconf _NPROCESSORS_ONLN)"
+fi
+
+# Renders an access graph, unless it has already been rendered from the same DOT content,
+# whose hash is kept next to the rendered files
+render() {
+	ag="${1%%.*}"
+	hash="$(sha1sum < "$ag.dot")"
+	if [ -f "$ag.png" ] && [ -f "$ag.pdf" ] && [ "$(cat "$ag.sha1" 2> /dev/null)" == "$hash" ]; then
+		echo "Rendering access graph: $ag... Unchanged!"
+		return
+	fi
+	rm -f "$ag.sha1"
+	dot -Tpng -o "$ag.png" "$ag.dot" &&
+	dot -Tpdf -o "$ag.pdf" "$ag.dot" &&
+	echo "$hash" > "$ag.sha1" &&
+	echo "Rendering access graph: $ag... Done!"
+}
+export -f render
+
+ls $PATTERN | xargs -P "$TRAVIOLI_JOBS" -I {} bash -c 'render "$1"' _ {}
@@ -21,8 +21,30 @@ if [ -z "$TRAVIOLI_EXCLUDE_PATTERN" ]; then
   export TRAVIOLI_EXCLUDE_PATTERN="node_modules/|perf/|test/"
 fi
 
+# Set trace format (csv or bin)
+if [ -z "$TRAVIOLI_TRACE_FORMAT" ]; then
+  export TRAVIOLI_TRACE_FORMAT="csv"
+fi
+
+# Analyze the trace while it is being collected, if a lookahead (in events) is set
+if [ -n "$TRAVIOLI_LOOKAHEAD" ]; then
+  "$NODEJS" $@ || exit 1
+  mkdir -p ".travioli"
+  rm -f ".travioli/trace.csv"
+  mkfifo ".travioli/trace.csv" || exit 1
+  "$PYTHON" "$TRAVIOLI_DIR/src/py/readtrace.py" --trace_csv "trace.csv" --lookahead "$TRAVIOLI_LOOKAHEAD" &
+  ANALYSIS_PID=$!
+  if ! "$TRAVIOLI_DIR/bin/collect_trace.sh" --format csv "$TRAVIOLI_DIR/node_modules/jalangi2" $@; then
+    kill $ANALYSIS_PID
+    exit 1
+  fi
+  wait $ANALYSIS_PID &&
+  tail -4 ".travioli/traversals.out"
+  exit
+fi
+
 "$NODEJS" $@ &&
-"$TRAVIOLI_DIR/bin/collect_trace.sh" "$TRAVIOLI_DIR/node_modules/jalangi2" $@ &&
-"$PYTHON" "$TRAVIOLI_DIR/src/py/readtrace.py" && 
+"$TRAVIOLI_DIR/bin/collect_trace.sh" --format "$TRAVIOLI_TRACE_FORMAT" "$TRAVIOLI_DIR/node_modules/jalangi2" $@ &&
+"$PYTHON" "$TRAVIOLI_DIR/src/py/readtrace.py" --trace_csv "trace.$TRAVIOLI_TRACE_FORMAT" && 
 tail -3 ".travioli/traversals.out"
 
@@ -50,11 +50,23 @@ var path = require('path');
         var HOP = sandbox.Constants.HOP;
 
         var outDir = sandbox.initParams['outDir'] || '.travioli';
-        var traceWriter = new logging.TraceWriter(sandbox, outDir+"/trace.csv");
+        var traceFormat = sandbox.initParams['traceFormat'] || 'csv';
+        var traceWriter = traceFormat === 'bin' ?
+            new logging.BinaryTraceWriter(sandbox, outDir+"/trace.bin") :
+            new logging.TraceWriter(sandbox, outDir+"/trace.csv");
 
-        function logEvent(str) {
+        // Logs an event given its kind followed by its fields, e.g. logEvent('R', sid, iid, fid, offset, value, type)
+        function logEvent() {
             if (traceWriter) {
-                traceWriter.logToFile(str+"\n");
+                if (traceFormat === 'bin') {
+                    traceWriter.logEvent(arguments);
+                } else {
+                    var str = arguments[0];
+                    for (var i = 1; i < arguments.length; i++) {
+                        str += "," + arguments[i];
+                    }
+                    traceWriter.logToFile(str+"\n");
+                }
             }
         }
 
@@ -277,7 +289,7 @@ var path = require('path');
                 sandbox.smemory.getIDFromShadowObjectOrFrame(shadowObj.owner) : 0;
             var v = getValue(val);
             if (shadowObj.isProperty) {
-                logEvent('G,' + sandbox.sid + "," + iid + "," + objectId + "," + ownerId + "," + getOffset(offset) + "," + getValue(val) + "," + getType(val));
+                logEvent('G', sandbox.sid, iid, objectId, ownerId, getOffset(offset), getValue(val), getType(val));
             }
         };
 
@@ -290,18 +302,18 @@ var path = require('path');
             var ownerId = shadowObj.owner ? 
                 sandbox.smemory.getIDFromShadowObjectOrFrame(shadowObj.owner) : 0;
             if (shadowObj.isProperty) {
-                logEvent('P,' + sandbox.sid + "," + iid + "," + objectId + "," + ownerId + "," + getOffset(offset) + "," + getValue(val) + "," + getType(val));
+                logEvent('P', sandbox.sid, iid, objectId, ownerId, getOffset(offset), getValue(val), getType(val));
             }
         };
 
         this.read = function (iid, name, val, isGlobal, isScriptLocal) {
             var shadowFrame = sandbox.smemory.getShadowFrame(name);
-            logEvent('R,' + sandbox.sid + "," + iid + "," + sandbox.smemory.getIDFromShadowObjectOrFrame(shadowFrame) + "," + getStringIndex(name) + "," + getValue(val) + "," + getType(val));
+            logEvent('R', sandbox.sid, iid, sandbox.smemory.getIDFromShadowObjectOrFrame(shadowFrame), getStringIndex(name), getValue(val), getType(val));
         };
 
         this.write = function (iid, name, val, lhs, isGlobal, isScriptLocal) {
             var shadowFrame = sandbox.smemory.getShadowFrame(name);
-            logEvent('W,' + sandbox.sid + "," + iid + "," + sandbox.smemory.getIDFromShadowObjectOrFrame(shadowFrame) + "," + getStringIndex(name) + "," + getValue(val) + "," + getType(val));
+            logEvent('W', sandbox.sid, iid, sandbox.smemory.getIDFromShadowObjectOrFrame(shadowFrame), getStringIndex(name), getValue(val), getType(val));
         };
 
         this.writeProp = function(iid, obj, prop) {
@@ -353,21 +365,21 @@ var path = require('path');
                 var frameId = sandbox.smemory.getIDFromShadowObjectOrFrame(shadowFrame);
                 // Log declarations of args with special symbol 'D' to indicate that the write is in the caller
                 if (argumentIndex >= 0) { // Formal parameter
-                    logEvent('D,' + sandbox.sid + "," + iid + "," + frameId + "," + getStringIndex(name) + "," + getValue(val) + "," + getType(val));
+                    logEvent('D', sandbox.sid, iid, frameId, getStringIndex(name), getValue(val), getType(val));
                 } else { // arguments object
                     var shadowArguments = sandbox.smemory.getShadowObjectOfObject(val);
                     var shadowId = sandbox.smemory.getIDFromShadowObjectOrFrame(shadowArguments);
-                    logEvent('D,' + sandbox.sid + "," + iid + "," + frameId + "," + getStringIndex("arguments") + "," + getValue(val) + "," + getType(val));                        
+                    logEvent('D', sandbox.sid, iid, frameId, getStringIndex("arguments"), getValue(val), getType(val));                        
                     for (var i = 0; i < val.length; i++) {
                         var argValue = val[i];
-                        logEvent('D,' + sandbox.sid + "," + iid + "," + shadowId + "," + getOffset(i) + "," + getValue(argValue) + "," + getType(argValue));                        
+                        logEvent('D', sandbox.sid, iid, shadowId, getOffset(i), getValue(argValue), getType(argValue));                        
                     }
                 }
             } else if (typeof val === "function") {
                 var shadowFrame = sandbox.smemory.getShadowFrame(name);
                 var frameId = sandbox.smemory.getIDFromShadowObjectOrFrame(shadowFrame);
                 // Log this as a write, not a declaration because the write is in the callee and not the caller
-                logEvent('W,' + sandbox.sid + "," + iid + "," + frameId + "," + getStringIndex(name) + "," + getValue(val) + "," + getType(val));
+                logEvent('W', sandbox.sid, iid, frameId, getStringIndex(name), getValue(val), getType(val));
                 // Initialize properties of function                
                 this.writeProp(iid, val, "name");          
                 this.writeProp(iid, val, "length");          
@@ -379,13 +391,13 @@ var path = require('path');
             var shadowFrame = sandbox.smemory.getShadowFrame('this');
             var frameId = sandbox.smemory.getIDFromShadowObjectOrFrame(shadowFrame);
             // First, log the function call
-            logEvent('C,'+lastsid+","+lastiid+","+sandbox.sid+","+iid+","+getValue(f)+","+frameId);
+            logEvent('C', lastsid, lastiid, sandbox.sid, iid, getValue(f), frameId);
             // Then, declare the write of "this" before moving to declaring args and function declarations (see the 'declare' callback)
-            logEvent('D,'+sandbox.sid+","+iid+"," + frameId + "," + getStringIndex("this") + "," + getValue(dis) + "," + getType(dis));
+            logEvent('D', sandbox.sid, iid, frameId, getStringIndex("this"), getValue(dis), getType(dis));
         };
 
         this.functionExit = function (iid, returnVal, wrappedExceptionVal) {
-            logEvent('E,' + sandbox.sid + "," + iid + "," + getValue(returnVal) + "," + getType(returnVal));
+            logEvent('E', sandbox.sid, iid, getValue(returnVal), getType(returnVal));
         };
 
 
@@ -411,9 +423,11 @@ var path = require('path');
          * in node.js endExecution() is called too early (Jalangi bug?) so we register a process exit call-back.
          */
         process.on('exit', function () {
-            endCurrentTrace();
+            // The string pool and source map are written before the trace is closed, so that
+            // they are available to an analysis reading the trace from a named pipe once it ends
             fs.writeFileSync(outDir+'/strings.json', JSON.stringify(stringList)+'\n');
             fs.writeFileSync(outDir+'/smap.json', JSON.stringify(sandbox.smap)+'\n');
+            endCurrentTrace();
         });
     }
 
@@ -157,3 +157,197 @@ module.exports.TraceWriter = function (sandbox, traceFileName) {
         this.flush();
     };
 };
+
+/**
+ * Writes trace events in a compact binary format (see src/py/tracefmt.py for the reader).
+ *
+ * The file starts with an 8-byte magic string followed by a sequence of blocks. Each block
+ * has a header of two little-endian uint32s (size of the block body in bytes, number of
+ * events) followed by the events of the block in columnar form: the codes of the event kinds
+ * and value types (1 byte each, see EVENT_CODES), the encodings of the eight columns (1 byte
+ * each), six integer columns where column j holds the j-th integer field of every event that
+ * has one, an integer column of values of objects, strings and undefined, and a column of
+ * values of primitives. The encoding of a column is the width of its values (1, 2 or 4 bytes
+ * for signed integers, 8 for float64), chosen as the smallest that fits all of them in the
+ * block, plus DELTA if the column holds the differences between consecutive values instead.
+ */
+module.exports.BinaryTraceWriter = function (sandbox, traceFileName) {
+    var fs = require('fs');
+
+    var MAGIC = 'TRAVBIN2';
+    var MAX_EVENTS = 1 << 16;
+    var MAX_FIELDS = 6;
+    var DELTA = 0x10;
+    // Number of int32 fields preceding the value (if any) for each event kind
+    var INT_FIELDS = {R: 4, W: 4, D: 4, G: 5, P: 5, C: 6, E: 2};
+    // Codes of the pairs of an event kind and a value type, as in tracefmt.py
+    var VALUE_TYPES = ['O', 'S', 'U', 'P', '-'];
+    var EVENT_CODES = {};
+    Object.keys(INT_FIELDS).sort().forEach(function (kind, i) {
+        VALUE_TYPES.forEach(function (type, j) {
+            EVENT_CODES[kind + type] = i * VALUE_TYPES.length + j;
+        });
+    });
+
+    function alloc(size) {
+        return Buffer.alloc ? Buffer.alloc(size) : new Buffer(size);
+    }
+
+    var header = alloc(8);
+    var encodings = alloc(MAX_FIELDS + 2);
+    var codes = alloc(MAX_EVENTS);
+    var fields = [];
+    var fieldsSize = [];
+    for (var j = 0; j < MAX_FIELDS; j++) {
+        fields.push(new Int32Array(MAX_EVENTS));
+        fieldsSize.push(0);
+    }
+    var intValues = new Int32Array(MAX_EVENTS);
+    var intValuesSize = 0;
+    var primValues = new Float64Array(MAX_EVENTS);
+    var primValuesSize = 0;
+    var count = 0;
+    var traceWfh = fs.openSync(traceFileName, 'w');
+    var tracingDone = false;
+
+    fs.writeSync(traceWfh, MAGIC, null, 'ascii');
+
+    // Returns the smallest width of signed integers between lo and hi, or 0 if none fits them
+    function intWidth(lo, hi) {
+        if (lo >= -128 && hi < 128) {
+            return 1;
+        } else if (lo >= -32768 && hi < 32768) {
+            return 2;
+        } else if (lo >= -2147483648 && hi < 2147483648) {
+            return 4;
+        }
+        return 0;
+    }
+
+    // Returns whether a primitive value can be stored as an int32 without loss
+    function isInt(value) {
+        return value === Math.floor(value) && value >= -2147483648 && value < 2147483648 &&
+            !(value === 0 && 1 / value < 0);
+    }
+
+    // Rejects a field of an event that an Int32Array would silently wrap
+    function checkInt32(value) {
+        var n = +value;
+        if (n !== Math.floor(n) || n < -2147483648 || n >= 2147483648) {
+            throw new Error("field out of int32 range: " + value);
+        }
+    }
+
+    /**
+     * Encodes the first n values of a column with the smallest encoding
+     * @return {{encoding: number, data: Buffer}}
+     */
+    function encodeColumn(values, n, floats) {
+        var i, data;
+        if (floats) {
+            for (i = 0; i < n; i++) {
+                if (!isInt(values[i])) {
+                    data = alloc(8 * n);
+                    for (i = 0; i < n; i++) {
+                        data.writeDoubleLE(values[i], 8 * i);
+                    }
+                    return {encoding: 8, data: data};
+                }
+            }
+        }
+        var lo = 0, hi = 0, deltaLo = 0, deltaHi = 0, prev = 0;
+        for (i = 0; i < n; i++) {
+            var delta = values[i] - prev;
+            prev = values[i];
+            lo = i === 0 ? prev : Math.min(lo, prev);
+            hi = i === 0 ? prev : Math.max(hi, prev);
+            deltaLo = i === 0 ? delta : Math.min(deltaLo, delta);
+            deltaHi = i === 0 ? delta : Math.max(deltaHi, delta);
+        }
+        var width = intWidth(lo, hi);
+        var deltaWidth = intWidth(deltaLo, deltaHi);
+        var useDelta = deltaWidth > 0 && deltaWidth < width;
+        if (useDelta) {
+            width = deltaWidth;
+        }
+        data = alloc(width * n);
+        prev = 0;
+        for (i = 0; i < n; i++) {
+            data.writeIntLE(useDelta ? values[i] - prev : values[i], width * i, width);
+            prev = values[i];
+        }
+        return {encoding: (useDelta ? DELTA : 0) | width, data: data};
+    }
+
+    /**
+     * @param event array-like of event kind followed by its fields, as logged in CSV
+     */
+    this.logEvent = function (event) {
+        if (tracingDone) {
+            return;
+        }
+        var kind = event[0];
+        var numInts = INT_FIELDS[kind];
+        var hasValue = event.length > numInts + 1;
+        var type = hasValue ? event[event.length - 1] : '-';
+        for (var j = 0; j < numInts; j++) {
+            checkInt32(event[j + 1]);
+        }
+        if (hasValue && type !== 'P') {
+            checkInt32(event[numInts + 1]);
+        }
+        codes[count] = EVENT_CODES[kind + type];
+        for (j = 0; j < numInts; j++) {
+            fields[j][fieldsSize[j]++] = +event[j + 1];
+        }
+        if (hasValue) {
+            var value = event[numInts + 1];
+            if (type === 'P') {
+                primValues[primValuesSize++] = Number(value);
+            } else {
+                intValues[intValuesSize++] = +value;
+            }
+        }
+        count++;
+        if (count === MAX_EVENTS) {
+            this.flush();
+        }
+    };
+
+    this.flush = function () {
+        if (count > 0) {
+            var columns = [];
+            for (var j = 0; j < MAX_FIELDS; j++) {
+                columns.push(encodeColumn(fields[j], fieldsSize[j], false));
+                fieldsSize[j] = 0;
+            }
+            columns.push(encodeColumn(intValues, intValuesSize, false));
+            columns.push(encodeColumn(primValues, primValuesSize, true));
+            var size = count + encodings.length;
+            columns.forEach(function (column, i) {
+                encodings[i] = column.encoding;
+                size += column.data.length;
+            });
+            header.writeUInt32LE(size, 0);
+            header.writeUInt32LE(count, 4);
+            fs.writeSync(traceWfh, header, 0, 8);
+            fs.writeSync(traceWfh, codes, 0, count);
+            fs.writeSync(traceWfh, encodings, 0, encodings.length);
+            columns.forEach(function (column) {
+                fs.writeSync(traceWfh, column.data, 0, column.data.length);
+            });
+        }
+        intValuesSize = 0;
+        primValuesSize = 0;
+        count = 0;
+    };
+
+    /**
+     * stop recording the trace and flush everything
+     */
+    this.stopTracing = function () {
+        tracingDone = true;
+        this.flush();
+        fs.closeSync(traceWfh);
+    };
+};
@@ -0,0 +1,147 @@
+"""
+ Copyright (c) 2016, University of California, Berkeley
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without
+ modification, are permitted provided that the following conditions are
+ met:
+
+ 1. Redistributions of source code must retain the above copyright
+ notice, this list of conditions and the following disclaimer.
+
+ 2. Redistributions in binary form must reproduce the above copyright
+ notice, this list of conditions and the following disclaimer in the
+ documentation and/or other materials provided with the distribution.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+ HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+ SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+ LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+ DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+ THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import gentrace
+
+# Benchmark of readtrace.py on synthetic traces (see gentrace.py) of growing sizes, measuring
+# its throughput, the time of its phases and its peak memory, so that performance changes can
+# be compared against a baseline without running node or Jalangi.
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+
+# Runs readtrace.py on the trace in a directory in a child process, and returns its profile
+# (see --stats) with the wall-clock time and the peak RSS (in KB) of the child
+def run_readtrace(trace_dir, trace_format, readtrace_args):
+	args = [sys.executable, os.path.realpath(__file__), '--run', '--dir', trace_dir, '--trace_csv', 
+		'trace.' + trace_format, '--stats', '--samples', '0'] + readtrace_args
+	with open(os.devnull, 'w') as devnull:
+		subprocess.check_call(args, stdout=devnull)
+	with open(trace_dir + '/stats.json') as stats_json:
+		stats = json.load(stats_json)
+	with open(trace_dir + '/peak_rss') as peak_rss:
+		stats['peak_rss_kb'] = int(peak_rss.read())
+	return stats
+
+# Runs readtrace.py in this process (which is a child of run_readtrace), recording its peak RSS.
+# The peak of the process itself is recorded, as that of all children of the benchmark would 
+# only ever grow from one run to the next.
+def run_in_process(readtrace_args):
+	sys.path.insert(0, script_dir)
+	import readtrace
+	sys.argv = ['readtrace.py'] + readtrace_args
+	readtrace.main()
+	trace_dir = readtrace_args[readtrace_args.index('--dir') + 1]
+	with open(trace_dir + '/peak_rss', 'w') as peak_rss:
+		peak_rss.write(str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+# Returns the exponent k for which time grows like size^k between two measurements
+def scaling_exponent(size1, time1, size2, time2):
+	if time1 <= 0 or time2 <= 0 or size1 == size2:
+		return None
+	return math.log(time2 / time1) / math.log(float(size2) / size1)
+
+# Runs each workload at each size. Larger sizes of a workload are skipped once a run of it took
+# longer than time_limit seconds, as workloads such as deep recursion scale super-linearly.
+def benchmark(workloads, sizes, trace_format, repeat, readtrace_args, work_dir, time_limit):
+	results = []
+	print "%-10s %8s %9s %9s %11s %9s %9s %9s" % ("workload", "size", "events", "time (s)", 
+		"events/s", "scan (s)", "rss (MB)", "scaling")
+	for workload in workloads:
+		previous = None
+		for size in sizes:
+			if previous is not None and time_limit is not None and previous['time'] > time_limit:
+				print "%-10s %8d %9s" % (workload, size, "skipped")
+				continue
+			trace_dir = os.path.join(work_dir, workload + '-' + str(size))
+			events = gentrace.generate_trace(trace_dir, [workload], size, trace_format)
+			# Take the fastest of the repetitions, and the largest peak RSS
+			runs = [run_readtrace(trace_dir, trace_format, readtrace_args) for i in xrange(repeat)]
+			best = min(runs, key=lambda stats: stats['total_time'])
+			result = {
+				'workload': workload, 
+				'size': size, 
+				'events': events,
+				'time': best['total_time'],
+				'events_per_second': events / best['total_time'] if best['total_time'] > 0 else None,
+				'phases': best['phases'],
+				'peak_rss_kb': max(stats['peak_rss_kb'] for stats in runs),
+				'scaling': scaling_exponent(previous['events'], previous['time'], events, best['total_time']) 
+					if previous is not None else None,
+			}
+			results.append(result)
+			previous = result
+			shutil.rmtree(trace_dir)
+			print "%-10s %8d %9d %9.3f %11.0f %9.3f %9.1f %9s" % (workload, size, events, result['time'], 
+				result['events_per_second'] or 0, result['phases'].get('scan', 0), result['peak_rss_kb'] / 1024.0,
+				"%.2f" % result['scaling'] if result['scaling'] is not None else "-")
+	return results
+
+
+if __name__ == "__main__":
+	if len(sys.argv) > 1 and sys.argv[1] == '--run':
+		run_in_process(sys.argv[2:])
+		sys.exit(0)
+	parser = argparse.ArgumentParser(description='Benchmark readtrace.py on synthetic traces '
+		'of growing sizes. Arguments after -- are passed to readtrace.py.')
+	parser.add_argument('--workloads', type=str, nargs='+', choices=sorted(gentrace.workloads.keys()), 
+		default=sorted(gentrace.workloads.keys()),
+		help="Workloads to benchmark, each in its own trace (default: all)")
+	parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+		help="Sizes of the workloads (default: 1000 10000 100000)")
+	parser.add_argument('--format', type=str, dest='format', choices=['csv', 'bin'], default='csv',
+		help="Format of the traces (default: csv)")
+	parser.add_argument('--repeat', type=int, dest='repeat', default=1,
+		help="Number of runs per trace, of which the fastest is reported (default: 1)")
+	parser.add_argument('--time_limit', type=float, dest='time_limit', default=60,
+		help="Seconds after which larger sizes of a workload are skipped (default: 60)")
+	parser.add_argument('--json', type=str, dest='json', default=None,
+		help="JSON file to write the results to, e.g. as a baseline (default: none)")
+	parser.add_argument('--work_dir', type=str, dest='work_dir', default=None,
+		help="Directory in which the traces are generated (default: a temporary directory)")
+	(args, readtrace_args) = parser.parse_known_args()
+	if len(readtrace_args) > 0 and readtrace_args[0] == '--':
+		readtrace_args = readtrace_args[1:]
+	work_dir = args.work_dir or tempfile.mkdtemp(prefix='travioli-bench-')
+	try:
+		results = benchmark(args.workloads, args.sizes, args.format, args.repeat, readtrace_args, work_dir, args.time_limit)
+	finally:
+		if args.work_dir is None:
+			shutil.rmtree(work_dir)
+	if args.json is not None:
+		with open(args.json, 'w') as results_json:
+			json.dump(results, results_json, indent=2, sort_keys=True)
@@ -0,0 +1,201 @@
+"""
+ Copyright (c) 2016, University of California, Berkeley
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without
+ modification, are permitted provided that the following conditions are
+ met:
+
+ 1. Redistributions of source code must retain the above copyright
+ notice, this list of conditions and the following disclaimer.
+
+ 2. Redistributions in binary form must reproduce the above copyright
+ notice, this list of conditions and the following disclaimer in the
+ documentation and/or other materials provided with the distribution.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+ HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+ SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+ LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+ DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+ THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import argparse
+import random
+import time
+
+from readtrace import Read, Ancestry, make_mem, compute_traversals, is_traversal_by_connectivity
+
+# Benchmark of traversal detection (Ancestry and is_traversal_by_connectivity) on synthetic
+# activations, against the sets of ancestors and the pairwise detection that readtrace.py
+# used to do, which gave up on AECs with more than 100 edges.
+
+FRAME = 1  # Frame ID of the activation
+
+# Creates a read of obj.field at an AEC. The value is an object if dst > 0.
+def make_read(src, field, aec, dst):
+	val = ('O', dst) if dst > 0 else ('N', 0)
+	return Read(src, make_mem(src, field), aec, val, dst, src == FRAME, None)
+
+# An array of n objects (read from a local variable), whose elements are read
+# at AEC 1 and a field of each element at AEC 2. The reads at AEC 2 are not a traversal.
+def array_reads(n):
+	arr = 2
+	reads = [make_read(FRAME, 0, 0, arr)]
+	for i in xrange(n):
+		elem = 10 + i
+		reads.append(make_read(arr, i, 1, elem))
+		reads.append(make_read(elem, 0, 2, 0))
+	return reads
+
+# Like array_reads, but the last element has a child which is also read at AEC 2,
+# so that the reads at AEC 2 are a traversal which is only evident after n edges
+def late_reads(n):
+	reads = array_reads(n)
+	elem = 10 + n - 1
+	child = 10 + n
+	reads.append(make_read(elem, 1, 2, child))
+	reads.append(make_read(child, 0, 2, 0))
+	return reads
+
+# A balanced binary tree of n nodes traversed recursively, reading the children
+# of each node at AEC 1 and a field of each node at AEC 2
+def tree_reads(n):
+	reads = [make_read(FRAME, 0, 0, 10)]
+	for node in xrange(10, 10 + n):
+		reads.append(make_read(node, 0, 2, 0))
+		for (field, child) in [(1, 2 * node - 9), (2, 2 * node - 8)]:
+			if child < 10 + n:
+				reads.append(make_read(node, field, 1, child))
+	return reads
+
+# A linked list of n nodes, whose next pointers are read at AEC 1 and a field of each
+# node at AEC 2
+def list_reads(n):
+	reads = [make_read(FRAME, 0, 0, 10)]
+	for node in xrange(10, 10 + n):
+		reads.append(make_read(node, 0, 2, 0))
+		reads.append(make_read(node, 1, 1, node + 1))
+	return reads
+
+# Random reads of an activation on a small heap, for comparing verdicts
+def random_reads(rng):
+	objs = [FRAME]
+	reads = []
+	for _ in xrange(rng.randint(1, 60)):
+		src = rng.choice(objs)
+		dst = rng.choice([0, rng.randint(2, 30)])
+		if dst > 0 and dst not in objs:
+			objs.append(dst)
+		reads.append(make_read(src, rng.randint(0, 3), rng.randint(0, 2), dst))
+	return reads
+
+# Returns the ancestry of objects and the heap reads of each AEC, as built by compute_traversals
+def build_heap_graph(reads):
+	ancestry = Ancestry()
+	heap_aec_map = {}
+	for read in reads:
+		if read.dstObj > 0:
+			ancestry.addEdge(read.srcObj, read.dstObj)
+		if not read.isRoot:
+			heap_aec_map.setdefault(read.aec, []).append(read)
+	return ancestry, heap_aec_map
+
+# Like build_heap_graph, but with a set of all ancestors per object as readtrace.py used to
+def build_heap_graph_sets(reads):
+	ancestors = {}
+	heap_aec_map = {}
+	for read in reads:
+		src = read.srcObj
+		dst = read.dstObj
+		if dst > 0:
+			if dst not in ancestors:
+				ancestors[dst] = set()
+			if src in ancestors:
+				ancestors[dst].update(ancestors[src])
+			else:
+				ancestors[dst].add(src)
+			ancestors[dst].add(dst)
+		if not read.isRoot:
+			heap_aec_map.setdefault(read.aec, []).append(read)
+	return ancestors, heap_aec_map
+
+# Returns true if any two edges read different memory locations of related objects, by
+# comparing all pairs of edges, optionally giving up after 100 edges as readtrace.py used to
+def is_traversal_pairwise(edges, ancestors, bail_out):
+	def path_exists(o1, o2):
+		return (o2 in ancestors and o1 in ancestors[o2]) or \
+			   (o1 in ancestors and o2 in ancestors[o1])
+	for i in range(len(edges)):
+		if bail_out and i > 100:
+			return False
+		e1 = edges[i]
+		for j in range(i):
+			e2 = edges[j]
+			if e1.mem != e2.mem and path_exists(e1.srcObj, e2.srcObj):
+				return True
+	return False
+
+# Returns the traversed AECs of an activation using a heap graph builder and a detection function
+def traversed_aecs(reads, build, is_traversal, *args):
+	(ancestors, heap_aec_map) = build(reads)
+	return set(aec for (aec, edges) in heap_aec_map.iteritems() 
+		if len(edges) > 1 and is_traversal(edges, ancestors, *args))
+
+def timed(fn, *args):
+	start = time.time()
+	result = fn(*args)
+	return result, time.time() - start
+
+def benchmark(sizes, max_pairwise_size):
+	print "%-6s %8s %10s %14s %14s %14s" % ("shape", "edges", "traversed", "current (s)", "bail-out (s)", "pairwise (s)")
+	shapes = [('array', array_reads), ('late', late_reads), ('tree', tree_reads), ('list', list_reads)]
+	for (shape, make_reads) in shapes:
+		for n in sizes:
+			reads = make_reads(n)
+			(traversed, t_current) = timed(traversed_aecs, reads, build_heap_graph, is_traversal_by_connectivity)
+			row = [shape, len(reads), ','.join(map(str, sorted(traversed))), "%.4f" % t_current]
+			# Sets of ancestors take quadratic time to build for lists
+			if n <= max_pairwise_size or shape != 'list':
+				(traversed_bail_out, t_bail_out) = timed(traversed_aecs, reads, build_heap_graph_sets, is_traversal_pairwise, True)
+				row.append("%.4f%s" % (t_bail_out, "" if traversed_bail_out == traversed else " (missed)"))
+			else:
+				row.append("-")
+			if n <= max_pairwise_size:
+				(traversed_pairwise, t_pairwise) = timed(traversed_aecs, reads, build_heap_graph_sets, is_traversal_pairwise, False)
+				assert(traversed_pairwise == traversed)
+				row.append("%.4f" % t_pairwise)
+			else:
+				row.append("-")
+			print "%-6s %8d %10s %14s %14s %14s" % tuple(row)
+
+# Checks that compute_traversals agrees with the pairwise detection on random activations
+def check(trials, seed):
+	rng = random.Random(seed)
+	for _ in xrange(trials):
+		reads = random_reads(rng)
+		(traversed, _) = compute_traversals(reads)
+		assert(traversed == traversed_aecs(reads, build_heap_graph_sets, is_traversal_pairwise, True))
+	print "Checked " + str(trials) + " random activations"
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Benchmark traversal detection '
+		'on synthetic activations.')
+	parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000],
+		help="Numbers of objects in the synthetic activations (default: 100 1000 10000 100000)")
+	parser.add_argument('--max_pairwise_size', type=int, default=3000,
+		help="Largest activation to run the pairwise detection without bail-out (or on a list) on (default: 3000)")
+	parser.add_argument('--check', type=int, dest='trials', default=1000,
+		help="Number of random activations to compare verdicts on (default: 1000)")
+	parser.add_argument('--seed', type=int, default=0,
+		help="Seed for the random activations (default: 0)")
+	args = parser.parse_args()
+	check(args.trials, args.seed)
+	benchmark(args.sizes, args.max_pairwise_size)
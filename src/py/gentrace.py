@@ -0,0 +1,396 @@
+"""
+ Copyright (c) 2016, University of California, Berkeley
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without
+ modification, are permitted provided that the following conditions are
+ met:
+
+ 1. Redistributions of source code must retain the above copyright
+ notice, this list of conditions and the following disclaimer.
+
+ 2. Redistributions in binary form must reproduce the above copyright
+ notice, this list of conditions and the following disclaimer in the
+ documentation and/or other materials provided with the distribution.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+ HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+ SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+ LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+ DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+ THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import argparse
+import csv
+import json
+import os
+
+import tracefmt
+
+# Generator of synthetic read-write traces, in the format written by src/js/LogData.js, for
+# parameterized workloads. Each workload is a small program in its own source file, whose
+# execution is emulated to log the events that Jalangi would log for it.
+
+# A JavaScript object in the emulated heap
+class Obj(object):
+	__slots__ = ['id', 'fields']
+	def __init__(self, oid):
+		self.id = oid
+		self.fields = {}
+
+# A function in the emulated program, with the location of its declaration and its function object
+class Func(object):
+	__slots__ = ['loc', 'paramsLoc', 'obj']
+	def __init__(self, loc, params_loc, obj):
+		self.loc = loc
+		self.paramsLoc = params_loc  # Location of the declarations of its parameters
+		self.obj = obj
+
+# Writes the trace, string pool and source map of an emulated execution to a directory
+class SyntheticTrace(object):
+	__slots__ = ['dir', 'traceFile', 'strings', 'stringIds', 'sourceMap', 'nextId', 'nextIid', 
+		'globalFrame', 'frames', 'lines']
+	def __init__(self, out_dir):
+		self.dir = out_dir
+		if not os.path.exists(out_dir):
+			os.makedirs(out_dir)
+		self.traceFile = open(out_dir + '/trace.csv', 'wb')
+		self.strings = []
+		self.stringIds = {}
+		self.sourceMap = {}
+		self.nextId = 1
+		self.nextIid = 1
+		self.globalFrame = self.newId()
+		self.frames = [self.globalFrame]
+		self.lines = 0
+
+	def newId(self):
+		oid = self.nextId
+		self.nextId += 1
+		return oid
+
+	def newObject(self):
+		return Obj(self.newId())
+
+	# Adds a source file and returns its SID
+	def newSource(self, file_name):
+		sid = len(self.sourceMap) + 1
+		self.sourceMap[str(sid)] = {'originalCodeFileName': file_name}
+		return sid
+
+	# Returns a new location in a source file, one per line
+	def loc(self, sid):
+		iid = self.nextIid
+		self.nextIid += 8
+		line = len(self.sourceMap[str(sid)])
+		self.sourceMap[str(sid)][str(iid)] = [line, 1, line, 40]
+		return (sid, iid)
+
+	# Returns the offset of a field, which is an index in the string pool unless it is a number
+	def offset(self, field):
+		if isinstance(field, int):
+			return field
+		if field not in self.stringIds:
+			self.strings.append(field)
+			self.stringIds[field] = -len(self.strings)
+		return self.stringIds[field]
+
+	# Returns the value and the type of a value as logged in the trace
+	def value(self, val):
+		if isinstance(val, Obj):
+			return (val.id, 'O')
+		elif val is None:
+			return (0, 'U')
+		elif isinstance(val, str):
+			return (self.offset(val), 'S')
+		else:
+			return (val, 'P')
+
+	def log(self, *fields):
+		self.traceFile.write(','.join(map(str, fields)) + '\n')
+		self.lines += 1
+
+	def read(self, loc, name, val, frame=None):
+		(value, type) = self.value(val)
+		self.log('R', loc[0], loc[1], frame or self.frames[-1], self.offset(name), value, type)
+
+	def write(self, loc, name, val, frame=None):
+		(value, type) = self.value(val)
+		self.log('W', loc[0], loc[1], frame or self.frames[-1], self.offset(name), value, type)
+
+	def readGlobal(self, loc, name, val):
+		self.read(loc, name, val, self.globalFrame)
+
+	def writeGlobal(self, loc, name, val):
+		self.write(loc, name, val, self.globalFrame)
+
+	def getField(self, loc, obj, field):
+		val = obj.fields.get(field)
+		(value, type) = self.value(val)
+		self.log('G', loc[0], loc[1], obj.id, obj.id, self.offset(field), value, type)
+		return val
+
+	def putField(self, loc, obj, field, val):
+		obj.fields[field] = val
+		(value, type) = self.value(val)
+		self.log('P', loc[0], loc[1], obj.id, obj.id, self.offset(field), value, type)
+
+	# Declares a global function and returns it
+	def newFunction(self, sid, name):
+		loc = self.loc(sid)
+		func = Func(loc, self.loc(sid), self.newObject())
+		self.writeGlobal(loc, name, func.obj)
+		for field in ['name', 'length', 'prototype']:
+			self.putField(loc, func.obj, field, 1)
+		return func
+
+	# Calls a function with a list of (NAME x VAL) parameters from a call site
+	def call(self, site, func, params=[]):
+		frame = self.newId()
+		(sid, iid) = func.loc
+		self.log('C', site[0], site[1], sid, iid, func.obj.id, frame)
+		self.frames.append(frame)
+		(value, type) = self.value(None)
+		self.log('D', sid, iid, frame, self.offset('this'), value, type)
+		for (name, val) in params:
+			(value, type) = self.value(val)
+			self.log('D', func.paramsLoc[0], func.paramsLoc[1], frame, self.offset(name), value, type)
+
+	def ret(self, func, val=None):
+		(value, type) = self.value(val)
+		self.log('E', func.loc[0], func.loc[1], value, type)
+		self.frames.pop()
+
+	def close(self):
+		self.traceFile.close()
+		with open(self.dir + '/strings.json', 'w') as strings_json:
+			json.dump(self.strings, strings_json)
+		with open(self.dir + '/smap.json', 'w') as smap_json:
+			json.dump(self.sourceMap, smap_json)
+
+
+##############################
+# Workloads
+##############################
+
+# Builds a linked list of n nodes at a location and returns its head
+def build_list(t, loc, n):
+	head = None
+	for i in xrange(n, 0, -1):
+		node = t.newObject()
+		t.putField(loc, node, 'data', i)
+		t.putField(loc, node, 'next', head)
+		head = node
+	return head
+
+# Walks a linked list of n nodes in a loop, twice
+def list_workload(t, n):
+	sid = t.newSource('list.js')
+	head = build_list(t, t.loc(sid), n)
+	t.writeGlobal(t.loc(sid), 'list', head)
+	walk = t.newFunction(sid, 'walk')
+	(la, lb) = (t.loc(sid), t.loc(sid))
+	for site in [t.loc(sid), t.loc(sid)]:
+		t.readGlobal(site, 'walk', walk.obj)
+		t.call(site, walk)
+		t.readGlobal(la, 'list', head)
+		node = head
+		t.write(la, 'node', node)
+		total = 0
+		while node is not None:
+			t.read(lb, 'node', node)
+			total += t.getField(lb, node, 'data')
+			t.read(lb, 'node', node)
+			node = t.getField(lb, node, 'next')
+			t.write(lb, 'node', node)
+		t.ret(walk, total)
+
+# Sums a complete binary tree of n nodes recursively
+def tree_workload(t, n):
+	sid = t.newSource('tree.js')
+	lt = t.loc(sid)
+	nodes = [t.newObject() for i in xrange(n)]
+	for i in xrange(n - 1, -1, -1):
+		t.putField(lt, nodes[i], 'value', i)
+		for (field, child) in [('left', 2 * i + 1), ('right', 2 * i + 2)]:
+			t.putField(lt, nodes[i], field, nodes[child] if child < n else None)
+	root = nodes[0] if n > 0 else None
+	t.writeGlobal(lt, 'tree', root)
+	tsum = t.newFunction(sid, 'sum')
+	(ta, tb, tc) = (t.loc(sid), t.loc(sid), t.loc(sid))
+	def visit(site, node):
+		t.readGlobal(site, 'sum', tsum.obj)
+		t.call(site, tsum, [('node', node)])
+		t.read(ta, 'node', node)
+		if node is None:
+			t.ret(tsum, 0)
+			return
+		t.read(ta, 'node', node)
+		t.getField(ta, node, 'value')
+		t.read(tb, 'node', node)
+		visit(tb, t.getField(tb, node, 'left'))
+		t.read(tc, 'node', node)
+		visit(tc, t.getField(tc, node, 'right'))
+		t.ret(tsum, 1)
+	site = t.loc(sid)
+	t.readGlobal(site, 'tree', root)
+	visit(site, root)
+
+# Searches a linked list of n nodes recursively for a few values, recursing up to n deep
+def recursion_workload(t, n):
+	sid = t.newSource('recursion.js')
+	head = build_list(t, t.loc(sid), n)
+	t.writeGlobal(t.loc(sid), 'list', head)
+	contains = t.newFunction(sid, 'contains')
+	(ra, rb, rc) = (t.loc(sid), t.loc(sid), t.loc(sid))
+	site = t.loc(sid)
+	for x in [1, n // 2, n + 1]:
+		t.readGlobal(site, 'list', head)
+		# The recursion is emulated with a loop, as it can be deeper than Python's
+		depth = 0
+		(call_site, node) = (site, head)
+		while True:
+			t.readGlobal(call_site, 'contains', contains.obj)
+			t.call(call_site, contains, [('node', node), ('x', x)])
+			depth += 1
+			t.read(ra, 'node', node)
+			if node is None:
+				result = 0
+				break
+			t.read(rb, 'node', node)
+			data = t.getField(rb, node, 'data')
+			t.read(rb, 'x', x)
+			if data == x:
+				result = 1
+				break
+			t.read(rc, 'node', node)
+			(call_site, node) = (rc, t.getField(rc, node, 'next'))
+			t.read(rc, 'x', x)
+		for i in xrange(depth):
+			t.ret(contains, result)
+
+# Walks a linked list of n nodes three times per activation, which is a redundant traversal
+def redundant_workload(t, n):
+	sid = t.newSource('redundant.js')
+	head = build_list(t, t.loc(sid), n)
+	t.writeGlobal(t.loc(sid), 'list', head)
+	walk3 = t.newFunction(sid, 'walkThrice')
+	(qa, qb) = (t.loc(sid), t.loc(sid))
+	site = t.loc(sid)
+	for activation in xrange(2):
+		t.readGlobal(site, 'walkThrice', walk3.obj)
+		t.call(site, walk3)
+		for k in xrange(3):
+			t.readGlobal(qa, 'list', head)
+			node = head
+			t.write(qa, 'n', node)
+			while node is not None:
+				t.read(qb, 'n', node)
+				node = t.getField(qb, node, 'next')
+				t.write(qb, 'n', node)
+		t.ret(walk3)
+
+# Sums a flat array of n elements in a loop
+def array_workload(t, n):
+	sid = t.newSource('array.js')
+	la = t.loc(sid)
+	arr = t.newObject()
+	for i in xrange(n):
+		t.putField(la, arr, i, i)
+	t.putField(la, arr, 'length', n)
+	t.writeGlobal(la, 'arr', arr)
+	total = t.newFunction(sid, 'total')
+	(sa, sb) = (t.loc(sid), t.loc(sid))
+	site = t.loc(sid)
+	t.readGlobal(site, 'arr', arr)
+	t.call(site, total, [('a', arr)])
+	t.read(sa, 'a', arr)
+	length = t.getField(sa, arr, 'length')
+	for i in xrange(length):
+		t.write(sb, 'i', i)
+		t.read(sb, 'a', arr)
+		t.read(sb, 'i', i)
+		t.getField(sb, arr, i)
+	t.ret(total)
+
+# Makes n calls to a small function from a loop at the top level
+def frames_workload(t, n):
+	sid = t.newSource('frames.js')
+	lc = t.loc(sid)
+	counter = t.newObject()
+	t.putField(lc, counter, 'count', 0)
+	t.writeGlobal(lc, 'counter', counter)
+	incr = t.newFunction(sid, 'increment')
+	(ia, ib) = (t.loc(sid), t.loc(sid))
+	site = t.loc(sid)
+	for i in xrange(n):
+		t.write(site, 'i', i, t.globalFrame)
+		t.readGlobal(site, 'increment', incr.obj)
+		t.call(site, incr, [('by', 1)])
+		t.readGlobal(ia, 'counter', counter)
+		count = t.getField(ia, counter, 'count')
+		t.read(ib, 'by', 1)
+		t.readGlobal(ib, 'counter', counter)
+		t.putField(ib, counter, 'count', count + 1)
+		t.ret(incr)
+
+workloads = {
+	'list': list_workload,
+	'tree': tree_workload,
+	'recursion': recursion_workload,
+	'redundant': redundant_workload,
+	'array': array_workload,
+	'frames': frames_workload,
+}
+
+# Returns the locations of a CSV trace that are missing from its source map
+def missing_locations(out_dir):
+	with open(out_dir + '/smap.json') as smap_json:
+		source_map = json.load(smap_json)
+	missing = set()
+	with open(out_dir + '/trace.csv', 'rb') as trace_csv:
+		for row in csv.reader(trace_csv):
+			# Every event starts with a location, and calls are followed by the location of the callee
+			locs = [(row[1], row[2])] + ([(row[3], row[4])] if row[0] == 'C' else [])
+			for (sid, iid) in locs:
+				if iid not in source_map.get(sid, {}):
+					missing.add((int(sid), int(iid)))
+	return missing
+
+# Generates a trace of workloads of the given size in a directory, in CSV or binary format,
+# and returns its number of events
+def generate_trace(out_dir, names, size, trace_format='csv'):
+	t = SyntheticTrace(out_dir)
+	for name in names:
+		workloads[name](t, size)
+	t.close()
+	missing = missing_locations(out_dir)
+	if len(missing) > 0:
+		raise RuntimeError("Locations missing from the source map: " + str(sorted(missing)[:10]))
+	if trace_format == 'bin':
+		tracefmt.convert_csv_trace(out_dir + '/trace.csv', out_dir + '/trace.bin')
+		os.remove(out_dir + '/trace.csv')
+	return t.lines
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Generate a synthetic read-write trace '
+		'(with its string pool and source map) for analysis with readtrace.py.')
+	parser.add_argument('--dir', type=str, dest='dir', default='.travioli',
+		help="Output directory (default: .travioli)")
+	parser.add_argument('--workloads', type=str, nargs='+', choices=sorted(workloads.keys()), 
+		default=sorted(workloads.keys()),
+		help="Workloads executed one after the other in the trace (default: all)")
+	parser.add_argument('--size', type=int, dest='size', default=1000,
+		help="Size of the data structures (or number of calls) of each workload (default: 1000)")
+	parser.add_argument('--format', type=str, dest='format', choices=['csv', 'bin'], default='csv',
+		help="Format of the trace, written to trace.csv or trace.bin (default: csv)")
+	args = parser.parse_args()
+	events = generate_trace(args.dir, args.workloads, args.size, args.format)
+	print "Generated " + str(events) + " events in " + args.dir
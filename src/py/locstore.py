@@ -0,0 +1,221 @@
+"""
+ Copyright (c) 2016, University of California, Berkeley
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without
+ modification, are permitted provided that the following conditions are
+ met:
+
+ 1. Redistributions of source code must retain the above copyright
+ notice, this list of conditions and the following disclaimer.
+
+ 2. Redistributions in binary form must reproduce the above copyright
+ notice, this list of conditions and the following disclaimer in the
+ documentation and/or other materials provided with the distribution.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+ HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+ SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+ LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+ DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+ THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+
+# Indexed binary stores of the source map (smap.json) and of the AEC table (aec.json),
+# which are looked up through mmap instead of loading the JSON files, since the source map
+# can be hundreds of MB for large applications instrumented with --inlineSource.
+#
+# A source map index starts with SMAP_MAGIC and a header (number of files, SIDs and
+# locations) followed by:
+#   - the byte offsets of the file names in the name pool (one more than the number of files)
+#   - the SIDs with the index of their file name, sorted by SID
+#   - the locations (SID, IID) with their positions, sorted by (SID, IID)
+#   - the name pool of UTF-8 encoded file names
+# An AEC index starts with AEC_MAGIC and the number of AECs followed by:
+#   - the offsets of the AEC sequences in the locations (one more than the number of AECs)
+#   - the locations (SID, IID) of all AEC sequences
+# All numbers are little-endian int32s (offsets are uint32s).
+
+SMAP_MAGIC = 'TRAVSMP1'
+AEC_MAGIC = 'TRAVAEC1'
+
+smap_header = struct.Struct('<III')
+aec_header = struct.Struct('<I')
+offset_record = struct.Struct('<I')
+sid_record = struct.Struct('<ii')          # SID x FILE
+loc_record = struct.Struct('<iiiiii')      # SID x IID x LINE_START x COL_START x LINE_END x COL_END
+aec_loc_record = struct.Struct('<ii')      # SID x IID
+
+
+# Returns the name of the index of a JSON file, e.g. smap.idx for smap.json
+def index_file(json_file):
+	return os.path.splitext(json_file)[0] + '.idx'
+
+# Returns whether the index of a JSON file exists and is not older than it
+def is_index_current(json_file):
+	idx_file = index_file(json_file)
+	return os.path.exists(idx_file) and \
+		(not os.path.exists(json_file) or os.path.getmtime(idx_file) >= os.path.getmtime(json_file))
+
+# Writes the chunks of an index to a temporary file which is then renamed, so that
+# an interrupted write never leaves a truncated index behind
+def write_index(idx_file, chunks):
+	with open(idx_file + '.tmp', 'wb') as f:
+		for chunk in chunks:
+			f.write(chunk)
+	os.rename(idx_file + '.tmp', idx_file)
+
+# Writes the index of a source map, as loaded from smap.json
+def write_source_map_index(source_map, idx_file):
+	files = []
+	file_idx = {}
+	sids = []
+	locs = []
+	for (sid, entry) in source_map.iteritems():
+		file_name = entry['originalCodeFileName']
+		if file_name not in file_idx:
+			file_idx[file_name] = len(files)
+			files.append(file_name)
+		sids.append((int(sid), file_idx[file_name]))
+		for (iid, pos) in entry.iteritems():
+			if iid.isdigit() and isinstance(pos, list):
+				locs.append((int(sid), int(iid)) + tuple(pos[:4]))
+	sids.sort()
+	locs.sort()
+	names = [file_name.encode('utf-8') for file_name in files]
+	name_offsets = [0]
+	for name in names:
+		name_offsets.append(name_offsets[-1] + len(name))
+	write_index(idx_file, [SMAP_MAGIC, smap_header.pack(len(files), len(sids), len(locs))] + \
+		[offset_record.pack(offset) for offset in name_offsets] + \
+		[sid_record.pack(*sid) for sid in sids] + \
+		[loc_record.pack(*loc) for loc in locs] + names)
+
+# Writes the index of an AEC table, given the sequence of locations of each AEC
+def write_aec_index(aec_seqs, idx_file):
+	offsets = [0]
+	for seq in aec_seqs:
+		offsets.append(offsets[-1] + len(seq))
+	write_index(idx_file, [AEC_MAGIC, aec_header.pack(len(aec_seqs))] + \
+		[offset_record.pack(offset) for offset in offsets] + \
+		[aec_loc_record.pack(sid, iid) for seq in aec_seqs for (sid, iid) in seq])
+
+# Returns the index of a record with the given key in count records of a sorted table
+# starting at base, comparing the first len(key) fields of each record, or -1 if none has it
+def find_record(mm, base, count, record, key):
+	lo = 0
+	hi = count
+	n = len(key)
+	while lo < hi:
+		mid = (lo + hi) // 2
+		mid_key = record.unpack_from(mm, base + mid * record.size)[:n]
+		if mid_key < key:
+			lo = mid + 1
+		elif mid_key > key:
+			hi = mid
+		else:
+			return mid
+	return -1
+
+# Memory-maps an index file and checks its magic
+def map_index(idx_file, magic):
+	with open(idx_file, 'rb') as f:
+		mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+	if mm[:len(magic)] != magic:
+		mm.close()
+		raise ValueError("Not an index file: " + idx_file)
+	return mm
+
+# Random-access view of a source map index
+class SourceMapIndex(object):
+	__slots__ = ['mm', 'numFiles', 'numSids', 'numLocs', 'sidsBase', 'locsBase', 'namesBase']
+	def __init__(self, idx_file):
+		self.mm = map_index(idx_file, SMAP_MAGIC)
+		(self.numFiles, self.numSids, self.numLocs) = smap_header.unpack_from(self.mm, len(SMAP_MAGIC))
+		self.sidsBase = len(SMAP_MAGIC) + smap_header.size + (self.numFiles + 1) * offset_record.size
+		self.locsBase = self.sidsBase + self.numSids * sid_record.size
+		self.namesBase = self.locsBase + self.numLocs * loc_record.size
+
+	# Returns the name of the source file of an SID
+	def fileName(self, sid):
+		i = find_record(self.mm, self.sidsBase, self.numSids, sid_record, (int(sid),))
+		if i < 0:
+			raise KeyError(sid)
+		(_, file_idx) = sid_record.unpack_from(self.mm, self.sidsBase + i * sid_record.size)
+		offsets_base = len(SMAP_MAGIC) + smap_header.size + file_idx * offset_record.size
+		(start,) = offset_record.unpack_from(self.mm, offsets_base)
+		(end,) = offset_record.unpack_from(self.mm, offsets_base + offset_record.size)
+		return self.mm[self.namesBase + start:self.namesBase + end].decode('utf-8')
+
+	# Returns the position [LINE_START, COL_START, LINE_END, COL_END] of a location
+	def position(self, sid, iid):
+		i = find_record(self.mm, self.locsBase, self.numLocs, loc_record, (int(sid), int(iid)))
+		if i < 0:
+			raise KeyError((sid, iid))
+		return list(loc_record.unpack_from(self.mm, self.locsBase + i * loc_record.size)[2:])
+
+	def close(self):
+		self.mm.close()
+
+# Random-access view of an AEC index
+class AecIndex(object):
+	__slots__ = ['mm', 'numAecs', 'locsBase']
+	def __init__(self, idx_file):
+		self.mm = map_index(idx_file, AEC_MAGIC)
+		(self.numAecs,) = aec_header.unpack_from(self.mm, len(AEC_MAGIC))
+		self.locsBase = len(AEC_MAGIC) + aec_header.size + (self.numAecs + 1) * offset_record.size
+
+	def __len__(self):
+		return self.numAecs
+
+	# Returns the sequence of locations [SID, IID] of an AEC
+	def sequence(self, aec):
+		if aec < 0 or aec >= self.numAecs:
+			raise KeyError(aec)
+		offsets_base = len(AEC_MAGIC) + aec_header.size + aec * offset_record.size
+		(start,) = offset_record.unpack_from(self.mm, offsets_base)
+		(end,) = offset_record.unpack_from(self.mm, offsets_base + offset_record.size)
+		return [list(aec_loc_record.unpack_from(self.mm, self.locsBase + i * aec_loc_record.size)) 
+			for i in xrange(start, end)]
+
+	def close(self):
+		self.mm.close()
+
+# Opens the index of a source map JSON file, (re-)building it if it is missing or outdated
+def open_source_map(json_file):
+	if not is_index_current(json_file):
+		with open(json_file) as source_map_json:
+			write_source_map_index(json.load(source_map_json), index_file(json_file))
+	return SourceMapIndex(index_file(json_file))
+
+# Opens the index of an AEC table JSON file, (re-)building it if it is missing or outdated
+def open_aec_table(json_file):
+	if not is_index_current(json_file):
+		with open(json_file) as aec_json:
+			write_aec_index(json.load(aec_json), index_file(json_file))
+	return AecIndex(index_file(json_file))
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Build the indexes of a source map '
+		'and an AEC table.')
+	parser.add_argument('--dir', type=str, dest='dir', default='.travioli',
+		help="Working directory (default: .travioli)")
+	parser.add_argument('--smap_json', type=str, dest='source_map_json', default='smap.json',
+		help="Source map JSON file (default: smap.json)")
+	parser.add_argument('--aec_json', type=str, dest='aec_json', default='aec.json',
+		help="AEC mappings JSON file (default: aec.json)")
+	args = parser.parse_args()
+	open_source_map(args.dir + '/' + args.source_map_json).close()
+	open_aec_table(args.dir + '/' + args.aec_json).close()
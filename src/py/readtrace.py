@@ -28,10 +28,20 @@
 """
 import argparse
 import re
+import fnmatch
 import collections, itertools
 import csv, json
+import cPickle, gzip
+import time
+import heapq
+import sqlite3
 from collections import namedtuple, defaultdict
 import os
+import sys
+import multiprocessing
+import traceback
+import tracefmt
+import locstore
 
 import random
 random.seed("icse2017")  # Fixed seed for reproducibility of experiments
@@ -52,21 +62,35 @@ except ImportError:
 		def update(self, amount):
 			pass
 
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
 ##############################
 # Driver and I/O
 ##############################
 
 # Global data
 strings = []      # IDX -> STRING
-source_map = {}   # SSID -> IID -> [LINE_START, COL_START, LINE_END, COL_END]
+source_map = None # Index of SID -> IID -> [LINE_START, COL_START, LINE_END, COL_END] (see locstore)
 last_reads = {}   # MEM -> INT, map of memory location to line-number in trace where last read
 line = 0          # INT
+lookahead_complete = True  # BOOL, whether last_reads covers the rest of the trace (see stream_trace)
+assumed_live = set()       # {MEM} // Memory locations kept live as they are not read within the lookahead
+unchecked_funcs = defaultdict(int)  # FUNC -> INT // Activations analyzed before the source map was available
 total_frames_analyzed = 0
 set_funcs_analyzed = set()
 
 # Program driver
 def main() :
-	global strings, source_map, line
+	global strings, source_map, line, raec_cache_size, memory_sampler
+	global max_activations, activation_rate, convergence_window
 
 	# Command-line arguments
 	parser = argparse.ArgumentParser(description='Analyze a read-write '
@@ -74,7 +98,8 @@ def main() :
 	parser.add_argument('--dir', type=str, dest='dir', default='.travioli', 
         help="Working directory (default: travioli)")
 	parser.add_argument('--trace_csv', type=str, dest='trace_csv', default='trace.csv', 
-        help="Read-write trace file (default: trace.csv)")
+        help="Read-write trace file, in CSV or binary format, optionally compressed with " + \
+        	"gzip, bzip2 or xz (default: trace.csv)")
 	parser.add_argument('--strings_json', type=str, dest='strings_json', default='strings.json', 
         help="String pool JSON file (default: strings.json)")
 	parser.add_argument('--smap_json', type=str, dest='source_map_json', default='smap.json', 
@@ -86,55 +111,163 @@ def main() :
 	parser.add_argument('--samples', type=int, dest='sample_size', default=10,
 		help="Number of samples to randomly annotate with '*' " + \
     		"for manual evaluation (default: 10; see: paper)")
+	parser.add_argument('--jobs', type=int, dest='jobs', default=multiprocessing.cpu_count(),
+		help="Number of processes used to scan the trace for liveness and to " + \
+			"output access graphs (default: number of CPUs)")
+	parser.add_argument('--workers', type=int, dest='workers', default=0,
+		help="Number of worker processes to which the analysis of activations " + \
+			"is offloaded (default: 0, i.e. analyze in the main process)")
+	parser.add_argument('--shards', type=int, dest='shards', default=0,
+		help="Number of processes that analyze shards of the trace split at " + \
+			"top-level calls (default: 0, i.e. do not shard)")
+	parser.add_argument('--checkpoint', type=int, dest='checkpoint', default=0,
+		help="Save a checkpoint of the analysis every N lines of the trace " + \
+			"(default: 0, i.e. no checkpoints)")
+	parser.add_argument('--checkpoint_file', type=str, dest='checkpoint_file', default='checkpoint.gz',
+		help="Checkpoint file (default: checkpoint.gz)")
+	parser.add_argument('--resume', action='store_true', dest='resume',
+		help="Resume the analysis from the checkpoint file if it exists")
+	parser.add_argument('--raec_cache_size', type=int, dest='raec_cache_size', default=0,
+		help="Maximum number of cached RAECs relative to the global scope, beyond which " + \
+			"the least recently used ones are evicted (default: 0, i.e. unbounded)")
+	parser.add_argument('--stats', action='store_true', dest='stats',
+		help="Profile the analysis and write the profile to the stats JSON file")
+	parser.add_argument('--stats_json', type=str, dest='stats_json', default='stats.json',
+		help="Profile JSON file written with --stats (default: stats.json)")
+	parser.add_argument('--memory_samples', type=int, dest='memory_samples', default=0,
+		help="Record the sizes of the analysis data structures and the memory usage every " + \
+			"N lines of the trace in the memory CSV file (default: 0, i.e. do not record)")
+	parser.add_argument('--memory_csv', type=str, dest='memory_csv', default='memory.csv',
+		help="Memory usage CSV file written with --memory_samples, along with the access " + \
+			"graph sizes in the file with the suffix _ag (default: memory.csv)")
+	parser.add_argument('--sqlite', type=str, dest='sqlite', default=None,
+		help="SQLite database to which the results are also exported, e.g. traversals.db " + \
+			"(default: none)")
+	parser.add_argument('--lookahead', type=int, dest='lookahead', default=0,
+		help="Analyze a CSV trace while it is being written (e.g. to a named pipe), computing " + \
+			"liveness only for the next N events (default: 0, i.e. scan the whole trace first)")
+	parser.add_argument('--max_activations', type=int, dest='max_activations', default=0,
+		help="Maximum number of activations analyzed per function (default: 0, i.e. no limit)")
+	parser.add_argument('--activation_rate', type=float, dest='activation_rate', default=1.0,
+		help="Probability with which each activation of a function is analyzed (default: 1.0)")
+	parser.add_argument('--convergence', type=int, dest='convergence', default=0,
+		help="Stop analyzing a function after N consecutive activations that do not change " + \
+			"its access graph (default: 0, i.e. never)")
+	parser.add_argument('--focus', type=str, dest='focus', nargs='+', default=None,
+		help="Analyze only the activations of functions (SID:IID), of functions in source files " + \
+			"(globs) or called along AECs of a previous analysis (aec:N) (default: all)")
+	parser.add_argument('--focus_dir', type=str, dest='focus_dir', default='focus',
+		help="Directory within the working directory to which the results are written " + \
+			"with --focus (default: focus)")
 
 
 	# Parse arguments
 	args = parser.parse_args()
+	if args.workers > 0 and args.shards > 0:
+		parser.error("--workers and --shards cannot be combined")
+	if args.shards > 0 and (args.checkpoint > 0 or args.resume):
+		parser.error("--shards cannot be combined with checkpoints")
+	if args.lookahead > 0 and (args.shards > 0 or args.checkpoint > 0 or args.resume):
+		parser.error("--lookahead cannot be combined with --shards or checkpoints")
+	if args.memory_samples > 0 and args.shards > 0:
+		parser.error("--memory_samples cannot be combined with --shards")
+	if args.activation_rate <= 0 or args.activation_rate > 1:
+		parser.error("--activation_rate must be in (0, 1]")
+	if args.shards > 0 and (args.max_activations > 0 or args.activation_rate < 1 or args.convergence > 0):
+		parser.error("--shards cannot be combined with sampling of activations")
 	trace_csv_file = args.dir + '/' + args.trace_csv
+	if tracefmt.is_compressed_trace(trace_csv_file) and (args.shards > 0 or args.checkpoint > 0 or args.resume):
+		parser.error("A compressed trace cannot be combined with --shards or checkpoints")
+	# Named pipes are checked once streaming starts, as reading their first bytes would consume them
+	if args.lookahead > 0 and os.path.isfile(trace_csv_file) and tracefmt.is_binary_trace(trace_csv_file):
+		parser.error("--lookahead requires a trace in the CSV format")
 	strings_json_file = args.dir + '/' + args.strings_json
 	source_map_json_file = args.dir + '/' + args.source_map_json
 	aec_json_file = args.dir + '/' + args.aec_json
-	output_file = args.dir + '/' + args.out
+	checkpoint_file = args.dir + '/' + args.checkpoint_file
+	if args.focus is not None:
+		try:
+			parse_focus(args.focus, aec_json_file)
+		except ValueError as e:
+			parser.error(str(e))
+		if args.lookahead > 0 and len(focus_files) > 0:
+			parser.error("--lookahead cannot be combined with --focus on source files")
+	# Results of a focused analysis are written to their own directory, so that the AEC table of 
+	# the analysis of the whole trace (from which focused AECs are taken) is kept
+	out_dir = args.dir
+	if args.focus is not None:
+		out_dir = args.dir + '/' + args.focus_dir
+		if not os.path.isdir(out_dir):
+			os.makedirs(out_dir)
+	aec_out_file = out_dir + '/' + args.aec_json
+	output_file = out_dir + '/' + args.out
+	raec_cache_size = args.raec_cache_size
+	max_activations = args.max_activations
+	activation_rate = args.activation_rate
+	convergence_window = args.convergence
 	traversals_sample_size = args.sample_size
 	redundant_traversals_sample_size = args.sample_size
 
-	with open(source_map_json_file) as source_map_json:
-		source_map = json.load(source_map_json)
+	if args.stats:
+		enable_profiling()
+	start_time = time.time()
+	if args.memory_samples > 0:
+		memory_sampler = MemorySampler(out_dir + '/' + args.memory_csv, args.memory_samples)
+
+	# The program writes these files when it exits, so a streamed trace has to be read first
+	if args.lookahead == 0:
+		load_program_info(source_map_json_file, strings_json_file)
+
+	position = None
+	if args.lookahead > 0:
+		push_sets(0, 0, 0)
+	elif args.resume and os.path.exists(checkpoint_file):
+		total_lines, position = load_checkpoint(checkpoint_file, trace_csv_file)
+	else:
+		if args.resume:
+			print "No checkpoint found, analyzing from the start of the trace"
+		total_lines = compute_last_reads(trace_csv_file, args.jobs)
+		if args.checkpoint > 0:
+			save_liveness(checkpoint_file, trace_csv_file, total_lines)
+		push_sets(0, 0, 0)
+	resolve_focus()
+	end_phase('prepass')
+
+	if args.workers > 0:
+		start_analysis_pool(args.workers)
+
+	if args.shards > 0:
+		analyze_shards(trace_csv_file, total_lines, args.shards)
+	elif args.lookahead > 0:
+		stream_trace(trace_csv_file, args.lookahead, source_map_json_file, strings_json_file)
+	else:
+		scan_trace(trace_csv_file, total_lines, position, args.checkpoint, checkpoint_file)
 
-	with open(strings_json_file) as strings_json:
-		strings = json.load(strings_json)
+	finish_analysis_pool()
+	drop_excluded_funcs()
+	end_phase('scan')
+	if memory_sampler is not None:
+		memory_sampler.sample()
+		memory_sampler.close()
 
-	with open(trace_csv_file) as trace_csv:
-		trace_reader = csv.reader(trace_csv)
-		line = 0
-		for row in trace_reader:
-			line = line + 1
-			read_mem = extract_read_mem(row)
-			if read_mem is not None:
-				last_reads[read_mem] = line
-	total_lines = line
-
-	push_sets(0, 0, 0)
-	with open(trace_csv_file) as trace_csv:
-		trace_reader = csv.reader(trace_csv)
-		with ProgressBar(max_value=total_lines) as pb:
-			line = 0
-			for row in trace_reader:
-				line = line + 1
-				handle_row(row)
-				if line % 1e3 == 0:
-					pb.update(line)
-
-	# Dump AEC table to JSON
-	with open(aec_json_file, 'w') as aec_json:
-		json.dump(aec_seq_tab, aec_json)
+	print "RAEC cache: " + str(raec_cache_stats['hits']) + " hits, " + str(raec_cache_stats['misses']) + \
+		" misses, " + str(raec_cache_stats['evictions']) + " evictions"
+	if args.lookahead > 0:
+		print str_liveness_stats(args.lookahead)
+
+	# Dump AEC table to JSON and to its index
+	aec_seqs = [get_aec_seq(aec) for aec in xrange(len(aec_tab))]
+	with open(aec_out_file, 'w') as aec_json:
+		json.dump(aec_seqs, aec_json)
+	locstore.write_aec_index(aec_seqs, locstore.index_file(aec_out_file))
+	end_phase('aec_output')
 
 
 	# Dump access graphs to DOT and collect traversal infos
 	traversal_infos = defaultdict(DataStructureTraversalInfo)
-	for func in func_ag_map.keys():
-		dot_access_graphs(func, args.dir)
-		collect_traversed_data_structures(func, traversal_infos)
+	for (func, traversed) in output_access_graphs(func_ag_map.keys(), out_dir, args.jobs):
+		merge_traversed_data_structures(func, traversed, traversal_infos)
+	end_phase('dot_output')
 
 
 	# Collect totals
@@ -187,8 +320,8 @@ def main() :
 				func = raec_func_map[raec]
 				out.write("    # Analyzed Function: " + str_loc(func) + "\n")
 				out.write("    # Access Graph: ag_" + str_func(func) + "\n")
-				out.write("    # Reached from the following AECs: " + str_list_truncate(list(raec_read_map[raec]), 5) + "\n")
-				out.write("    # Last written at the following AECs: " + str_list_truncate(list(raec_write_map[raec]), 5) + "\n")
+				out.write("    # Reached from the following AECs: " + str_list_truncate(sorted(raec_read_map[raec]), 5) + "\n")
+				out.write("    # Last written at the following AECs: " + str_list_truncate(sorted(raec_write_map[raec]), 5) + "\n")
 		out.write("\n")
 		out.write("Done! Analyzed " + str(total_frames_analyzed) + " activations of " + str(len(set_funcs_analyzed)) + " functions.\n")
 		out.write("Traversed " + \
@@ -199,7 +332,233 @@ def main() :
 			str(len(set_redun_traversed_structures)) + " data structures in " + \
 		    str(len(set_redun_funcs_traversed))  + " functions, across " + \
 			str(len(set_redun_traversed_raecs)) + " RAECs.\n")
+		if args.lookahead > 0:
+			out.write(str_liveness_stats(args.lookahead) + "\n")
+		sampled = sampled_funcs()
+		if len(sampled) > 0:
+			out.write("Sampled activations of " + str(len(sampled)) + " functions:\n")
+			for (func, samples) in sampled:
+				out.write("    - " + str_loc(func) + ": analyzed " + str(samples.analyzed) + " of " + \
+					str(samples.activations) + " activations (" + samples.reason() + ")\n")
+
+	end_phase('report')
+	if args.sqlite is not None:
+		export_sqlite(out_dir + '/' + args.sqlite, traversal_infos, random_t_samples, random_r_samples)
+		end_phase('sqlite_output')
+
+	if args.stats:
+		write_stats(out_dir + '/' + args.stats_json, time.time() - start_time, args.lookahead)
+
+	# The analysis is complete, so its checkpoint is no longer needed
+	remove_checkpoint(checkpoint_file)
+
+
+# Loads the source map and the string pool of the program
+def load_program_info(source_map_json_file, strings_json_file):
+	global source_map, strings
+	source_map = locstore.open_source_map(source_map_json_file)
 
+	with open(strings_json_file) as strings_json:
+		strings = json.load(strings_json)
+
+# Size of trace chunks scanned by each job in the liveness pre-pass
+chunk_size = 64 * 1024 * 1024
+
+# Populates last_reads by scanning the trace in parallel chunks
+# and returns the total number of lines in the trace
+def compute_last_reads(trace_csv_file, jobs):
+	binary = tracefmt.is_binary_trace(trace_csv_file)
+	if tracefmt.is_compressed_trace(trace_csv_file):
+		# A compressed trace cannot be split, so it is scanned as a single chunk without an end
+		chunks = [(len(tracefmt.MAGIC) if binary else 0, None)]
+	elif binary:
+		chunks = tracefmt.split_blocks(trace_csv_file, chunk_size)
+	else:
+		chunks = split_chunks(trace_csv_file, chunk_size)
+	tasks = [(trace_csv_file, binary, start, end) for (start, end) in chunks]
+	# Binary traces can be scanned without creating Python objects per row if NumPy is available
+	vectorized = binary and numpy is not None
+	scan = scan_chunk_arrays if vectorized else scan_chunk
+	if jobs > 1 and len(tasks) > 1:
+		pool = multiprocessing.Pool(min(jobs, len(tasks)))
+		results = pool.imap(scan, tasks)
+	else:
+		pool = None
+		results = itertools.imap(scan, tasks)
+	# Merge chunk results in trace order, so that later reads overwrite earlier ones
+	total_lines = 0
+	if vectorized:
+		all_mems = []
+		all_lines = []
+		for (chunk_lines, chunk_mems, chunk_mem_lines) in results:
+			all_mems.append(chunk_mems)
+			all_lines.append(chunk_mem_lines + total_lines)
+			total_lines += chunk_lines
+		if len(all_mems) > 0:
+			mems, lines = last_occurrences(numpy.concatenate(all_mems), numpy.concatenate(all_lines))
+			last_reads.update(itertools.izip(mems.tolist(), lines.tolist()))
+	else:
+		for (chunk_lines, chunk_last_reads) in results:
+			for mem, chunk_line in chunk_last_reads.iteritems():
+				last_reads[mem] = total_lines + chunk_line
+			total_lines += chunk_lines
+	if pool is not None:
+		pool.close()
+		pool.join()
+	return total_lines
+
+# Splits a file into byte ranges [START, END) of roughly the given size which end on line boundaries
+def split_chunks(file_name, size):
+	file_size = os.path.getsize(file_name)
+	chunks = []
+	with open(file_name, 'rb') as f:
+		start = 0
+		while start < file_size:
+			f.seek(min(start + size, file_size))
+			f.readline()
+			end = f.tell()
+			chunks.append((start, end))
+			start = end
+	return chunks
+
+# Scans a chunk of the trace and returns the number of lines in it along with
+# a map of memory locations to the (chunk-relative) line-number where last read
+def scan_chunk(task):
+	(trace_csv_file, binary, start, end) = task
+	chunk_last_reads = {}
+	chunk_line = 0
+	if binary:
+		for (kinds, types, fields, values) in tracefmt.iter_blocks(trace_csv_file, start, end):
+			for i in xrange(len(kinds)):
+				chunk_line = chunk_line + 1
+				read_mem = extract_block_read_mem(kinds, fields, i)
+				if read_mem is not None:
+					chunk_last_reads[read_mem] = chunk_line
+	else:
+		with tracefmt.open_trace(trace_csv_file) as trace_csv:
+			if end is None:
+				lines = trace_csv
+			else:
+				trace_csv.seek(start)
+				lines = trace_csv.read(end - start).splitlines()
+			for row in csv.reader(lines):
+				chunk_line = chunk_line + 1
+				read_mem = extract_read_mem(row)
+				if read_mem is not None:
+					chunk_last_reads[read_mem] = chunk_line
+	return chunk_line, chunk_last_reads
+
+# Scans a chunk of a binary trace with NumPy and returns the number of lines in it along
+# with arrays of packed memory locations and the (chunk-relative) line-numbers where last read
+def scan_chunk_arrays(task):
+	(trace_csv_file, _, start, end) = task
+	chunk_mems = []
+	chunk_mem_lines = []
+	chunk_line = 0
+	for (kinds, types, fields, _) in tracefmt.iter_block_arrays(trace_csv_file, start, end, with_values=False):
+		# Reads are (fid, offset) in fields 3-4 and getfields are (oid, offset) in fields 4-5
+		is_read = kinds == ord('R')
+		objs = numpy.where(is_read, fields[2], fields[3])
+		offsets = numpy.where(is_read, fields[3], fields[4])
+		is_mem = (is_read | (kinds == ord('G'))) & (objs != 0)
+		# Memory locations are packed in the same way as make_mem
+		chunk_mems.append((objs[is_mem].astype(numpy.int64) << 32) | 
+			(offsets[is_mem].astype(numpy.int64) & 0xffffffff))
+		chunk_mem_lines.append(chunk_line + 1 + numpy.flatnonzero(is_mem))
+		chunk_line += len(kinds)
+	if len(chunk_mems) == 0:
+		return chunk_line, numpy.zeros(0, numpy.int64), numpy.zeros(0, numpy.int64)
+	mems, lines = last_occurrences(numpy.concatenate(chunk_mems), numpy.concatenate(chunk_mem_lines))
+	return chunk_line, mems, lines
+
+# Returns the distinct keys in an array along with the last value paired with each key
+def last_occurrences(keys, values):
+	if len(keys) == 0:
+		return keys, values
+	order = numpy.argsort(keys, kind='mergesort') # stable, so last of each key remains last
+	keys = keys[order]
+	values = values[order]
+	is_last = numpy.append(keys[1:] != keys[:-1], True)
+	return keys[is_last], values[is_last]
+
+# Scans the trace from a position (or from the start) and handles its events, saving a
+# checkpoint every checkpoint_lines lines if non-zero
+def scan_trace(trace_file, total_lines, position, checkpoint_lines, checkpoint_file):
+	global line
+	next_checkpoint = line + checkpoint_lines
+	with ProgressBar(max_value=total_lines) as pb:
+		if tracefmt.is_binary_trace(trace_file):
+			start = position if position is not None else len(tracefmt.MAGIC)
+			for (_, block_end, block) in tracefmt.iter_blocks_with_offsets(trace_file, start):
+				handle_block(block)
+				pb.update(line)
+				sample_memory()
+				if checkpoint_lines > 0 and line >= next_checkpoint:
+					save_checkpoint(checkpoint_file, trace_file, total_lines, block_end)
+					next_checkpoint = line + checkpoint_lines
+		else:
+			with tracefmt.open_trace(trace_file) as trace_csv:
+				offset = [position or 0]
+				if position is not None:
+					trace_csv.seek(position)
+				# Count bytes read so that a checkpoint can record where to resume from
+				def counted_lines():
+					for raw_row in trace_csv:
+						offset[0] += len(raw_row)
+						yield raw_row
+				trace_reader = csv.reader(counted_lines() if checkpoint_lines > 0 else trace_csv)
+				for row in trace_reader:
+					line = line + 1
+					handle_row(row)
+					if line % 1e3 == 0:
+						pb.update(line)
+						sample_memory()
+					if checkpoint_lines > 0 and line >= next_checkpoint:
+						save_checkpoint(checkpoint_file, trace_file, total_lines, offset[0])
+						next_checkpoint = line + checkpoint_lines
+
+# Scans a CSV trace as it is being written, handling each event once the next lookahead events 
+# have been buffered. last_reads then only maps memory locations read within the buffered window 
+# to their last read in it, so whether locations not read within it are read later is unknown, 
+# and they are conservatively kept live (see is_live). The results are then the same as those of
+# scan_trace, but writes are only garbage-collected once the trace ends. The source map and 
+# string pool are loaded once the trace ends.
+def stream_trace(trace_file, lookahead, source_map_json_file, strings_json_file):
+	global line, lookahead_complete
+	window = collections.deque()  # [ROW x MEM]
+	lookahead_complete = False
+	with tracefmt.open_trace(trace_file) as trace_csv:
+		lines = iter(trace_csv)
+		first_line = next(lines, '')
+		if first_line.startswith(tracefmt.MAGIC):
+			raise ValueError("--lookahead requires a trace in the CSV format")
+		for row in csv.reader(itertools.chain([first_line] if first_line else [], lines)):
+			mem = extract_read_mem(row)
+			if mem is not None:
+				last_reads[mem] = line + len(window) + 1
+			window.append((row, mem))
+			if len(window) > lookahead:
+				handle_buffered_row(window)
+	lookahead_complete = True
+	load_program_info(source_map_json_file, strings_json_file)
+	while window:
+		handle_buffered_row(window)
+
+# Handles the first row in the lookahead window of stream_trace
+def handle_buffered_row(window):
+	global line
+	(row, mem) = window.popleft()
+	line = line + 1
+	handle_row(row)
+	if mem is not None and last_reads[mem] == line:
+		del last_reads[mem]
+	if line % 1000 == 0:
+		sample_memory()
+
+# Returns a summary of the liveness assumptions made by stream_trace
+def str_liveness_stats(lookahead):
+	return "Liveness beyond a lookahead of " + str(lookahead) + " events was unknown for " + \
+		str(len(assumed_live)) + " memory locations, which were kept live until the end of the trace."
 
 def str_list_truncate(seq, limit):
 	if len(seq) > limit:
@@ -219,16 +578,26 @@ def make_loc(sid, iid):
 def make_val(type, value):
 	return (type, value)
 
-# Constructor for Mem
+# Constructor for Mem, which packs the object (or frame) ID and the string-pool offset 
+# of the field into one integer, as the analysis keeps millions of them around
 def make_mem(ofid, offset):
-	return None if ofid == 0 else (ofid, offset)
+	return None if ofid == 0 else (ofid << 32) | (offset & 0xffffffff)
+
+# Returns the object (or frame) ID of a Mem
+def mem_obj(mem):
+	return mem >> 32
+
+# Returns the field (string-pool offset) of a Mem
+def mem_field(mem):
+	offset = mem & 0xffffffff
+	return offset - 0x100000000 if offset & 0x80000000 else offset
 
 # Returns the name of the source file for an SID
 str_sid_cache = {}
 def str_sid(sid):
 	sid = str(sid)
 	if sid not in str_sid_cache:
-		str_sid_cache[sid] = os.path.relpath(source_map[sid]['originalCodeFileName'])
+		str_sid_cache[sid] = os.path.relpath(source_map.fileName(sid))
 	return str_sid_cache[sid]
 
 # Returns string representation of a source location
@@ -241,9 +610,10 @@ def str_loc(loc, full=True):
 	iid = str(iid)
 	if full:
 		if loc not in str_loc_cache:
+			pos = source_map.position(sid, iid)
 			str_loc_cache[loc] = str_sid(sid) + \
-			  "[" + str(source_map[sid][iid][0]) + ":" + str(source_map[sid][iid][1]) + \
-			  "-" + str(source_map[sid][iid][2]) + ":" + str(source_map[sid][iid][3]) + ']'
+			  "[" + str(pos[0]) + ":" + str(pos[1]) + \
+			  "-" + str(pos[2]) + ":" + str(pos[3]) + ']'
 		return str_loc_cache[loc]
 	else:
 		return sid + ":" + iid
@@ -257,8 +627,7 @@ def str_mem(mem) :
 	if mem == None :
 		return "undefined"
 	else :
-		(oid, offset) = mem
-		return str(oid) + "." + string(offset)
+		return str(mem_obj(mem)) + "." + string(mem_field(mem))
 
 # Returns string representation of Val
 def str_val(val) :
@@ -266,17 +635,97 @@ def str_val(val) :
 	if type == "S" :
 		return type + ":"  + string(int(value))
 	else :
-		return type + ":" + value
+		return type + ":" + str(value)
 
 # Returns a string representation of a Call String :: [LOC]
 def str_call_string(cs):
 	return str(map(str_loc, cs))
 
-# Returns if a location is within node_modules or test
 exclude_pattern = re.compile(os.environ.get("TRAVIOLI_EXCLUDE_PATTERN", "node_modules/"))
+sid_filter_map = {}     # SID -> (BOOL x BOOL) // Whether a source file is excluded and whether it is focused
+
+# Returns whether a source file is excluded and whether it matches a file glob of --focus, 
+# which are decided once per SID
+def sid_filter(sid):
+	filtered = sid_filter_map.get(sid)
+	if filtered is None:
+		src_file = str_sid(sid)
+		filtered = sid_filter_map[sid] = (bool(exclude_pattern.search(src_file)), 
+			any(fnmatch.fnmatch(src_file, glob) for glob in focus_files))
+	return filtered
+
+# Returns if a location is within node_modules or test
 def is_excluded(loc):
-	src_file = str_sid(loc[0])
-	return bool(exclude_pattern.search(src_file))
+	if source_map is None:
+		return False
+	return sid_filter(loc[0])[0]
+
+focus = False           # BOOL // Whether only the activations selected with --focus are analyzed
+focus_files = []        # [GLOB] // Source files whose functions are analyzed
+focus_funcs = set()     # {FUNC} // Functions which are analyzed
+focus_aecs = []         # [[LOC]] // AECs along which activations are analyzed
+focus_nodes = set()     # {NODE} // Prefixes of focus_aecs in the AEC trie (see resolve_focus)
+
+# Parses the arguments of --focus, which are either a function as SID:IID, an AEC as aec:N (of the
+# AEC table of a previous analysis, in aec_json_file) or a glob of source files. Raises ValueError
+# if an AEC is not in the AEC table.
+def parse_focus(patterns, aec_json_file):
+	global focus
+	focus = True
+	aec_table = None
+	for pattern in patterns:
+		if re.match(r"^\d+:\d+$", pattern):
+			focus_funcs.add(tuple(map(int, pattern.split(':'))))
+		elif re.match(r"^aec:\d+$", pattern):
+			if aec_table is None:
+				if not os.path.isfile(aec_json_file):
+					raise ValueError("--focus " + pattern + " requires the AEC table of a previous analysis in " + aec_json_file)
+				aec_table = locstore.open_aec_table(aec_json_file)
+			aec = int(pattern[4:])
+			if aec >= len(aec_table):
+				raise ValueError("--focus " + pattern + " is not one of the " + str(len(aec_table)) + " AECs in " + aec_json_file)
+			focus_aecs.append([tuple(loc) for loc in aec_table.sequence(aec)])
+		else:
+			focus_files.append(pattern)
+	if aec_table is not None:
+		aec_table.close()
+
+# Computes the prefixes of the focused AECs in the AEC trie, which are the AEC prefixes of the 
+# frames called along them (see add_frame). This is done once the trie is restored from a checkpoint.
+def resolve_focus():
+	for aec_seq in focus_aecs:
+		node = 0
+		for loc in aec_seq:
+			node = extend_aec(node, loc)
+			focus_nodes.add(node)
+
+# Returns if the activation of a function in a frame is analyzed, i.e. if its function is not excluded 
+# and, with --focus, if it is a focused function, in a focused file or called along a focused AEC
+def is_analyzed(fid, func):
+	if focus and not (func in focus_funcs or fid_frame_map[fid][4] in focus_nodes or \
+			(len(focus_files) > 0 and sid_filter(func[0])[1])):
+		return False
+	return not is_excluded(func)
+
+# Drops the results of activations which were analyzed before the source map was available 
+# but turn out to be excluded
+def drop_excluded_funcs():
+	global total_frames_analyzed
+	# Functions whose activations were all sampled out (see sample_activation) are only in activation_samples
+	excluded_funcs = set(func for func in set(unchecked_funcs.keys()) | set(activation_samples.keys()) 
+		if is_excluded(func))
+	for func in excluded_funcs:
+		total_frames_analyzed -= unchecked_funcs.get(func, 0)
+		set_funcs_analyzed.discard(func)
+		func_ag_map.pop(func, None)
+		activation_samples.pop(func, None)
+	# Drop the RAECs relative to the excluded functions along with their reads and writes
+	for (raec, func) in raec_func_map.items():
+		if func in excluded_funcs:
+			del raec_func_map[raec]
+			raec_read_map.pop(raec, None)
+			raec_write_map.pop(raec, None)
+	unchecked_funcs.clear()
 
 
 ##############################
@@ -313,6 +762,39 @@ def extract_read_mem(row):
 	else :
 		return None
 
+# Handles a decoded block of a binary trace for processing read/write sets
+def handle_block(block, start=0, stop=None):
+	global line
+	(kinds, types, fields, values) = block
+	(f1, f2, f3, f4, f5, f6) = fields
+	for i in xrange(start, len(kinds) if stop is None else stop):
+		line = line + 1
+		kind = kinds[i]
+		if kind == "R":
+			handle_read(f1[i], f2[i], f3[i], f4[i], types[i], values[i])
+		elif kind == "W":
+			handle_write(f1[i], f2[i], f3[i], f4[i], types[i], values[i])
+		elif kind == "G":
+			handle_getfield(f1[i], f2[i], f3[i], f4[i], f5[i], types[i], values[i])
+		elif kind == "P":
+			handle_putfield(f1[i], f2[i], f3[i], f4[i], f5[i], types[i], values[i])
+		elif kind == "C":
+			handle_call(f1[i], f2[i], f3[i], f4[i], f5[i], f6[i])
+		elif kind == "E":
+			handle_return(f1[i], f2[i], types[i], values[i])
+		elif kind == "D":
+			handle_declare(f1[i], f2[i], f3[i], f4[i], types[i], values[i])
+
+# Extracts a memory reference from the i-th event of a decoded block iff it is a read or getfield
+def extract_block_read_mem(kinds, fields, i):
+	kind = kinds[i]
+	if kind == "R":
+		return make_mem(fields[2][i], fields[3][i])
+	elif kind == "G":
+		return make_mem(fields[3][i], fields[4][i])
+	else:
+		return None
+
 # Processes a READ row from the trace log
 def handle_read(sid, iid, fid, offset, type, value):
 	global line
@@ -330,6 +812,7 @@ def handle_write(sid, iid, fid, offset, type, value):
 	mem = make_mem(fid, offset)
 	val = make_val(type, value)
 	write_mem(mem, loc, val)
+	hold_frame(mem)
 	root_objects.add(fid)
 	pass
 
@@ -383,6 +866,7 @@ def handle_declare(sid, iid, fid, offset, type, value):
 	mem = make_mem(fid, offset)
 	val = make_val(type, value)
 	write_mem_parent(mem, loc, val)
+	hold_frame(mem)
 	pass
 
 
@@ -391,22 +875,226 @@ def handle_declare(sid, iid, fid, offset, type, value):
 #################################
 
 # Global data
-read_sets_stack = []    # [[FID X LOC x MEM x VAL]]  // List of reads-before-writes to a memory address, sequence per frame
+read_sets_stack = []    # [RS]                       // Reads-before-writes to a memory address, sequence per frame (see below)
 write_sets_stack = []   # [{MEM}]                    // Set of memory locations written to (per frame) up to current scan
-last_write_locs = {}    # MEM -> (FID x LOC)         // Map of (live) memory address to frame ID and IID of last ever write
+last_write_locs = {}    # MEM -> (NODE x LOC)        // Map of (live) memory address to AEC prefix of the frame (see add_frame) and IID of last ever write
 fid_stack = []          # [INT X LOC X FUNC]    // Frame ID, last-loc-in-lower-frame (usually caller IID) and IID of callee func declaration
 declarations_stack = [] # [[MEM]]               // List of "declarations" for this call stack frame
-fid_stack_map = {}      # INT -> FS, where FS = [INT X LOC x FUNC]   // The entire frame stack per frame ID
-fid_func_map = {}       # INT -> FUNC, where FUNC = LOC  // The IID of the syntactic function declaration/expression for this frame
-aec_id_map = {}         # STR -> INT   // Maps an AEC string to an AEC identifier
-aec_seq_tab = []        # INT -> [LOC] // Maps an AEC identifier to an AEC sequence
-raec_cache = {}         # (FID x FID x LOC) -> AEC, where FID = INT and AEC = INT // Map of (fid_bot, fid_top, loc) to RAEC
+fid_frame_map = {}      # INT -> FRAME  // The call tree, mapping a frame ID to its node (see add_frame)
+frame_refs = {}         # INT -> INT    // Number of references to each node of the call tree (see release_frame)
+frame_holds = {}        # INT -> INT    // Line of the last read of a variable of a frame, for frames whose variables are still read
+frame_expiries = []     # [INT X INT]   // Heap of the lines in frame_holds and their frame IDs (may contain stale entries)
+func_frames_map = {}    # FUNC -> [INT] // Frame IDs of the activations of each function on the call stack
+aec_trie = {}           # (NODE x LOC) -> NODE, where NODE = INT  // Hash-consed AEC sequences, mapping a prefix and a location to the extended prefix
+aec_trie_tab = [None]   # NODE -> (NODE x LOC)  // Maps a prefix to its parent prefix and last location (node 0 is the empty sequence)
+aec_node_map = {}       # NODE -> INT  // Maps a prefix to an AEC identifier, if the sequence is an AEC
+aec_tab = []            # INT -> NODE  // Maps an AEC identifier to its AEC sequence
+raec_cache = {}         # FID -> (FID x LOC) -> AEC, where FID = INT and AEC = INT // Map of fid_bot to (fid_top, loc) to RAEC,
+                        #   except for fid_bot = 0, which maps the AEC prefix of fid_top and loc (NODE x LOC) to RAEC
+raec_cache_old = {}     # (NODE x LOC) -> AEC  // Older generation of RAECs relative to the global scope (fid_bot = 0)
+raec_cache_size = 0     # INT  // Maximum number of cached RAECs relative to the global scope, 0 for unbounded
+raec_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
 raec_func_map = {}      # AEC -> FUNC, where AEC = INT and FUNC = LOC // Map of RAEC to function to which it is relative
 raec_read_map = defaultdict(set)  # AEC -> {AEC} // Maps a relative AEC to a set of read-AECs where the reads occurred
 raec_write_map = defaultdict(set) # AEC -> {AEC} // Maps a relative AEC to a set of write-AECs which supplied values that are read
 root_objects = set()    # {OBJ} // Root objects (e.g. stack frames, global scope, etc)
 
 
+# Read sets are shared rather than copied when a callee's reads are inherited by its caller.
+# A read set RS is a list of segments in trace order, the last of which is always a list. A 
+# segment is either a list of reads [FID X LOC X MEM X VAL], or a tuple (RS, {MEM}, INT, INT) 
+# of an inherited read set, the memory locations that were written in the caller at the time
+# (or None) whose reads are left out, an upper bound on its number of reads and its nesting depth.
+max_read_set_depth = 64
+
+# Returns an upper bound on the number of reads in a read set and its nesting depth
+def read_set_shape(read_set):
+	size = 0
+	depth = 0
+	for segment in read_set:
+		if type(segment) is list:
+			size += len(segment)
+		else:
+			size += segment[2]
+			depth = max(depth, segment[3] + 1)
+	return size, depth
+
+# Returns the reads in a read set as a list in trace order. The read set is replaced by this
+# list, so the frames referred to by the reads that are left out are released.
+def flatten_read_set(read_set):
+	if len(read_set) == 1:
+		return read_set[0]
+	reads = []
+	stack = [(iter(read_set), ())]
+	while len(stack) > 0:
+		(segments, filters) = stack[-1]
+		for segment in segments:
+			if type(segment) is list:
+				if len(filters) == 0:
+					reads.extend(segment)
+				elif len(filters) == 1:
+					ws = filters[0]
+					kept = [read for read in segment if read[2] not in ws]
+					if len(kept) < len(segment):
+						release_reads([read for read in segment if read[2] in ws])
+					reads.extend(kept)
+				else:
+					kept = [read for read in segment if not any(read[2] in ws for ws in filters)]
+					if len(kept) < len(segment):
+						release_reads([read for read in segment if any(read[2] in ws for ws in filters)])
+					reads.extend(kept)
+			else:
+				(inherited, ws, _, _) = segment
+				stack.append((iter(inherited), filters if ws is None else filters + (ws,)))
+				break
+		else:
+			stack.pop()
+	return reads
+
+# Adds the reads of a callee's read set to its caller's read set, if not written in the caller. 
+# The callee's reads are shared with a snapshot of the caller's write set unless filtering them
+# right away is cheaper.
+def inherit_read_set(caller_read_set, callee_read_set, caller_write_set):
+	size, depth = read_set_shape(callee_read_set)
+	if size == 0:
+		return
+	if len(caller_write_set) >= size or depth >= max_read_set_depth:
+		reads = flatten_read_set(callee_read_set)
+		if len(caller_write_set) > 0:
+			release_reads([read for read in reads if read[2] in caller_write_set])
+			reads = [read for read in reads if read[2] not in caller_write_set]
+		callee_read_set = [reads]
+		size, depth = len(reads), 0
+		ws = None
+	else:
+		ws = frozenset(caller_write_set) if len(caller_write_set) > 0 else None
+	if ws is None and len(callee_read_set) == 1:
+		# A flat list can be taken over as is, and the caller's own reads appended to it
+		caller_read_set.append(callee_read_set[0])
+	else:
+		caller_read_set.append((callee_read_set, ws, size, depth))
+		caller_read_set.append([])
+
+# Releases the frames referred to by all the reads in a read set that is dropped
+def release_read_set(read_set):
+	stack = [read_set]
+	while len(stack) > 0:
+		for segment in stack.pop():
+			if type(segment) is list:
+				release_reads(segment)
+			else:
+				stack.append(segment[0])
+
+# Pushes a frame on fid_stack and adds it to the call tree. A node of the call tree is a tuple 
+# ([INT X LOC X FUNC] X INT X INT X INT X NODE) of the fid_stack entry of the frame, the frame 
+# IDs of its parent and of its closest ancestor activation of the same function (or None), its 
+# depth, and its AEC prefix relative to the global scope (see aec_prefix). A node is removed once
+# its frame has returned and nothing refers to it any more (see release_frame), so the call tree
+# only keeps the frames on the stack and the returned frames that analysis may still look up.
+def add_frame(fid, loc, func):
+	entry = (fid, loc, func)
+	parent = fid_stack[-1][0] if len(fid_stack) > 0 else None
+	if func in func_frames_map:
+		frames = func_frames_map[func]
+		prev = frames[-1]
+		prefix = fid_frame_map[prev][4]
+	else:
+		frames = func_frames_map[func] = []
+		prev = None
+		prefix = extend_aec(fid_frame_map[parent][4], loc) if parent is not None else 0
+	fid_frame_map[fid] = (entry, parent, prev, len(fid_stack), prefix)
+	# The frame is referred to by fid_stack, and it refers to its parent and earlier activation
+	frame_refs[fid] = 1
+	for ref in (parent, prev):
+		if ref is not None:
+			frame_refs[ref] += 1
+	frames.append(fid)
+	fid_stack.append(entry)
+	root_objects.add(fid)
+
+# Pops a frame from fid_stack and returns its entry
+def remove_frame():
+	entry = fid_stack.pop()
+	func = entry[2]
+	frames = func_frames_map[func]
+	frames.pop()
+	if len(frames) == 0:
+		del func_frames_map[func]
+	return entry
+
+# A node of the call tree is referred to by fid_stack while its frame is on the stack, by the nodes
+# of its children and later activations of the same function (whose AEC prefixes are computed by 
+# walking up the tree, see aec_prefix), by each pending read in the read sets made in the frame or
+# of one of its variables, and by frame_holds while its variables are still read later on (reads 
+# of variables of returned frames from closures look up their frame, see resolve_reads). Last
+# writes refer to the AEC prefix of their frame instead (see last_write_locs).
+
+# Releases a reference to a node of the call tree, and removes the nodes no longer referred to
+def release_frame(fid):
+	stack = [fid]
+	while len(stack) > 0:
+		fid = stack.pop()
+		refs = frame_refs[fid] - 1
+		if refs > 0:
+			frame_refs[fid] = refs
+			continue
+		del frame_refs[fid]
+		(_, parent, prev, _, _) = fid_frame_map.pop(fid)
+		root_objects.discard(fid)
+		for ref in (parent, prev):
+			if ref is not None:
+				stack.append(ref)
+
+# Adds the references of a read to the frame it was made in and to the frame of the variable read
+def retain_read(fid, mem):
+	frame_refs[fid] += 1
+	obj = mem_obj(mem)
+	if obj in frame_refs:
+		frame_refs[obj] += 1
+
+# Releases the references of reads that are dropped from the read sets
+def release_reads(reads):
+	for (fid, _, mem, _) in reads:
+		release_frame(fid)
+		obj = mem_obj(mem)
+		if obj in frame_refs:
+			release_frame(obj)
+
+# Holds the frame of a variable being written until the last read of the variable
+def hold_frame(mem):
+	if mem is None:
+		return
+	fid = mem_obj(mem)
+	if fid not in frame_refs:
+		return
+	if lookahead_complete:
+		until = last_reads.get(mem, 0)
+		if until <= line:
+			return
+	else:
+		# While streaming, the variable may still be read beyond the lookahead (see is_live)
+		until = sys.maxint
+	held = frame_holds.get(fid)
+	if held is None:
+		frame_refs[fid] += 1
+	elif held >= until:
+		return
+	frame_holds[fid] = until
+	heapq.heappush(frame_expiries, (until, fid))
+
+# Releases the frames whose variables are no longer read
+def release_expired_frames():
+	while len(frame_expiries) > 0 and frame_expiries[0][0] <= line:
+		(until, fid) = heapq.heappop(frame_expiries)
+		if frame_holds.get(fid) == until:
+			del frame_holds[fid]
+			release_frame(fid)
+
+# Returns the function of a frame, or None if the frame is unknown
+def frame_func(fid):
+	frame = fid_frame_map.get(fid)
+	return frame[0][2] if frame is not None else None
+
 def is_root_obj(obj):
 	return obj in root_objects
 
@@ -424,17 +1112,14 @@ def peek_fid(depth=0):
 
 # Pushes an activation record on the call-stack
 def push_sets(fid, loc, func):
-	read_sets_stack.append([])
+	read_sets_stack.append([[]])
 	write_sets_stack.append(set())
-	fid_stack.append((fid, loc, func))
-	fid_stack_map[fid] = fid_stack[:] # copy
-	fid_func_map[fid] = func
-	root_objects.add(fid)
+	add_frame(fid, loc, func)
 	declarations_stack.append([])
 
 # Pops an activation record from the call-stack and analyzes it (** invokes core logic **)
 def pop_sets():
-	(callee_fid, call_loc, func) = fid_stack.pop()
+	(callee_fid, call_loc, func) = remove_frame()
 	declarations = declarations_stack.pop()
 	callee_read_set = read_sets_stack.pop()
 	caller_read_set = peek_read_set()
@@ -443,35 +1128,63 @@ def pop_sets():
 
 	# Warning! callee_write_set is not GC'd here, don't use it for analysis yet.
 
-	# Collect all callee's reads into caller's reads, if not written in caller
-	for read in callee_read_set:
-		_, _, mem, _ = read
-		if mem not in caller_write_set: 
-			caller_read_set.append(read)
+	# Only activations which are analyzed need their reads as a flat list. They are resolved before
+	# the reads are inherited, which may release the frames that they refer to.
+	analyze = len(fid_stack)>=0 and is_analyzed(callee_fid, func)
+	if analyze and is_sampling():
+		analyze = sample_activation(func)
+	if analyze:
+		callee_read_set = [flatten_read_set(callee_read_set)]
+		reads = resolve_reads(callee_fid, callee_read_set[0])
+		evict_raecs(callee_fid)
+
+	# Collect all callee's reads into caller's reads, if not written in caller. The global
+	# scope is never analyzed, so reads reaching it are dropped.
+	if len(fid_stack) > 1:
+		inherit_read_set(caller_read_set, callee_read_set, caller_write_set)
+	else:
+		release_read_set(callee_read_set)
+
+	# Collect all callee's writes into caller's writes, and garbage-collect them
+	inherit_write_set(caller_write_set, callee_write_set)
 
-	# Overwrite all of callee's writes into caller's writes
+	# Process activation
+	if analyze:
+		global total_frames_analyzed, set_funcs_analyzed
+		if analysis_pool is None:
+			merge_activation(func, analyze_activation(reads))
+		else:
+			submit_activation(func, reads)
+		total_frames_analyzed += 1
+		set_funcs_analyzed.add(func)
+		if source_map is None:
+			# A streamed trace is analyzed before the source map is written (see drop_excluded_funcs)
+			unchecked_funcs[func] += 1
+
+	# The frame is no longer on the stack
+	release_frame(callee_fid)
+	release_expired_frames()
+
+
+# Overwrites all of callee's writes into caller's writes, and runs garbage-collection on write-set of caller
+def inherit_write_set(caller_write_set, callee_write_set):
 	for mem in callee_write_set:
 		# Bother doing this only for live memory locations, since others will be deleted from caller (below) anyway.
 		if is_live(mem):
 			caller_write_set.add(mem)
 
-	# Run garbage-collection on write-set of caller
 	for mem in list(caller_write_set):
 		if not is_live(mem):
 			caller_write_set.remove(mem)
 
-	# Process activation
-	if len(fid_stack)>=0 and not is_excluded(func):
-		global total_frames_analyzed, set_funcs_analyzed
-		traversed_aecs, redun_traversed_aecs = compute_traversals(callee_fid, callee_read_set)
-		compute_access_graphs(func, callee_fid, callee_read_set, traversed_aecs, redun_traversed_aecs)
-		total_frames_analyzed += 1
-		set_funcs_analyzed.add(func)
-	pass
-
-
 def is_live(mem):
-	return mem in last_reads and last_reads[mem] > line
+	if mem in last_reads and last_reads[mem] > line:
+		return True
+	# While streaming, a location may still be read beyond the lookahead (see stream_trace)
+	if not lookahead_complete:
+		assumed_live.add(mem)
+		return True
+	return False
 
 def deep_kill_writes(mem):
 	for i in range(len(write_sets_stack)):
@@ -492,9 +1205,11 @@ def read_mem(mem, loc, val) :
 	rs = peek_read_set()
 	ws = peek_write_set()
 	fid, _, _ = peek_fid()
-	# Mark only reads that have not been written to (in this frame) but written to at least once (globally)
-	if mem not in ws and mem in last_write_locs: 
-		rs.append((fid, loc, mem, val))
+	# Mark only reads that have not been written to (in this frame) but written to at least once (globally),
+	# except in the global scope, which is never analyzed
+	if mem not in ws and mem in last_write_locs and len(fid_stack) > 1:
+		rs[-1].append((fid, loc, mem, val))
+		retain_read(fid, mem)
 	# Clean up
 	if not is_live(mem):
 		kill_writes(mem)
@@ -507,7 +1222,7 @@ def write_mem(mem, loc, val) :
 	ws.add(mem)
 	# Record global last-write to the memory location from this frame
 	fid, _, _ = peek_fid()
-	last_write_locs[mem] = (fid, loc)
+	last_write_locs[mem] = (fid_frame_map[fid][4], loc)
 	# Clean up
 	if not is_live(mem):
 		kill_writes(mem)
@@ -520,7 +1235,7 @@ def write_mem_parent(mem, loc, val) :
 	ws.add(mem)
 	fid, _, _ = peek_fid(1)
 	# Record global last-write to the memory location from parent frame
-	last_write_locs[mem] = (fid, loc)
+	last_write_locs[mem] = (fid_frame_map[fid][4], loc)
 	if not is_live(mem):
 		kill_writes(mem)
 
@@ -530,94 +1245,148 @@ def write_mem_parent(mem, loc, val) :
 #################################
 
 
-# Computes and returns the AEC sequence for a given stack of frames
-def compute_aec_seq(frame_stack):
-	# At least one element needed to serve as start-node
-	assert(len(frame_stack) > 0)
-
-	# Store edges in reverse, from a func to its predecessor
-	# with the call-site on the edge label and remember the path
-	# length from the root.
-	redges = {} # FUNC -> FUNC X LOC X INT
-
-	# Start node is the first function in the stack
-	(first_fid, caller_site, first_func) = frame_stack[0]
-
-	# Initialize cost of first_func to 0 with no back-edge
-	redges[first_func] = (None, None, 0)
-
-	# Process remaining stack and add back-edges with shortest-path
-	last_func = None
-	for (fid, call_site, func) in frame_stack:
-		if func not in redges:
-			cost = redges[last_func][2]+1
-			redges[func] = (last_func, call_site, cost)
-		last_func = func
-
-	# Either first_func is global scope which cannot be called,
-	# or first_func is a base function and last_func is a dummy end-node
-	assert(last_func != first_func)
-
-	# Now find the path in reverse order from last_func to first_func
-	total_cost = redges[last_func][2]
-	aec_seq = []
-	while last_func != first_func:
-		(last_func, call_site, cost) = redges[last_func]
-		aec_seq.append(call_site)
-
-	# Reverse the call-chain to get the correct value
-	aec_seq.reverse()
-
-	# Validate and return the ACC
-	assert(len(aec_seq) == total_cost)
-	return aec_seq
+# The AEC of a location in frame fid_top relative to frame fid_bot is the shortest path of 
+# call-sites from the function of fid_bot to the function of fid_top in the graph of the calls 
+# between them (where each function is entered via its first activation above fid_bot), followed
+# by the location. This path, the AEC prefix of fid_top, is the prefix of the closest ancestor 
+# activation of the same function above fid_bot if there is one, or else the prefix of its
+# parent extended with its call-site. The prefix of fid_bot itself is empty.
+aec_prefix_cache = {}   # FID -> FID -> NODE  // Map of fid_bot to fid_top to AEC prefix
+
+# Returns the AEC prefix of frame fid_top relative to frame fid_bot, as a node of the AEC trie.
+# Prefixes relative to the global scope are computed when frames are pushed.
+def aec_prefix(fid_bot, fid_top):
+	if fid_bot == 0:
+		return fid_frame_map[fid_top][4]
+	cache = aec_prefix_cache.get(fid_bot)
+	if cache is None:
+		cache = aec_prefix_cache[fid_bot] = {fid_bot: 0}
+	bot_depth = fid_frame_map[fid_bot][3]
+	# Walk up to fid_bot or a frame with a known prefix, remembering whether each step was to 
+	# the parent or to an earlier activation
+	steps = []
+	fid = fid_top
+	while fid not in cache:
+		(entry, parent, prev, depth, _) = fid_frame_map[fid]
+		assert(depth > bot_depth)
+		if prev is not None and fid_frame_map[prev][3] >= bot_depth:
+			steps.append((fid, None))
+			fid = prev
+		else:
+			steps.append((fid, entry[1]))
+			fid = parent
+	# Walk back down, computing the prefixes
+	node = cache[fid]
+	for (fid, call_site) in reversed(steps):
+		if call_site is not None:
+			node = extend_aec(node, call_site)
+		cache[fid] = node
+	return node
+
+# Return the node of the AEC trie for a prefix extended with a location
+def extend_aec(node, loc):
+	key = (node, loc)
+	child = aec_trie.get(key)
+	if child is None:
+		child = aec_trie[key] = len(aec_trie_tab)
+		aec_trie_tab.append(key)
+	return child
+
+# Return an AEC identifier for a node of the AEC trie
+def get_node_aec_id(node):
+	aec = aec_node_map.get(node)
+	if aec is None:
+		aec = aec_node_map[node] = len(aec_tab)
+		aec_tab.append(node)
+	return aec
 
 # Return an AEC identifier for given AEC sequence
-def get_aec_id(aec_seq) : # FIXME: Map keys are string representations of 
-	global aec_id_map
-	aec_str = '+'.join(map(str, aec_seq))
-	if aec_str not in aec_id_map:
-		aec_id_map[aec_str] = len(aec_seq_tab)
-		aec_seq_tab.append(aec_seq)
-	return aec_id_map[aec_str]
+def get_aec_id(aec_seq) :
+	node = 0
+	for loc in aec_seq:
+		node = extend_aec(node, loc)
+	return get_node_aec_id(node)
 
 
-# Return an AEC sequence to an AEC identifier
+# Return an AEC sequence to an AEC identifier, in reverse order
 def expand_aec(aec):
-	return reversed(aec_seq_tab[aec])
+	node = aec_tab[aec]
+	while node != 0:
+		(node, loc) = aec_trie_tab[node]
+		yield loc
+
+# Return the AEC sequence of an AEC identifier
+def get_aec_seq(aec):
+	seq = list(expand_aec(aec))
+	seq.reverse()
+	return seq
 
 # Return the traversal-point for an AEC
 def aec_top(aec):
-	return aec_seq_tab[aec][-1]
+	return aec_trie_tab[aec_tab[aec]][1]
 
 
 # Compute the relative AEC from a base frame, a stack top and current location
 def get_raec(fid_bot, fid_top, loc):
+	if fid_bot == 0:
+		return get_global_raec(fid_frame_map[fid_top][4], loc)
 	# Check cache first
-	key = (fid_bot, fid_top, loc)
-	if key in raec_cache:
-		return raec_cache[key]
+	key = (fid_top, loc)
+	cache = raec_cache.get(fid_bot)
+	if cache is None:
+		cache = raec_cache[fid_bot] = {}
+	if key in cache:
+		raec_cache_stats['hits'] += 1
+		return cache[key]
 	else:
-		# Get relevant portion of frame stack
-		bot_idx = -1
-		stack = fid_stack_map[fid_top]
-		for i, (fid, call_site, func) in enumerate(stack):
-			if fid == fid_bot:
-				bot_idx = i
-				break
-		assert(bot_idx >= 0)
-		# Construct the relative execution context (REC)
-		rec_seq = stack[bot_idx:]
-		rec_seq.append((None, loc, "__dummy_end_node__"))
-		# Reduce to the relative acyclic execution context (RAEC)
-		raec_seq = compute_aec_seq(rec_seq)
-		assert(raec_seq[-1] == loc)
-		# Get unique AEC identifier for this AEC sequence
-		raec_id = get_aec_id(raec_seq)
-		raec_cache[key] = raec_id
-		raec_func_map[raec_id] = fid_func_map[fid_bot]
+		raec_cache_stats['misses'] += 1
+		# The relative acyclic execution context (RAEC) is the AEC prefix extended with the location
+		raec_id = get_node_aec_id(extend_aec(aec_prefix(fid_bot, fid_top), loc))
+		cache[key] = raec_id
+		raec_func_map[raec_id] = frame_func(fid_bot)
+		return raec_id
+
+# Compute the AEC relative to the global scope from an AEC prefix (see add_frame) and a location.
+# These are cached by prefix, since a returned frame may be removed from the call tree.
+def get_global_raec(prefix, loc):
+	key = (prefix, loc)
+	cache = raec_cache.setdefault(0, {})
+	if key in cache:
+		raec_cache_stats['hits'] += 1
+		return cache[key]
+	elif key in raec_cache_old:
+		raec_cache_stats['hits'] += 1
+		raec_id = raec_cache_old.pop(key)
+		cache_global_raec(key, raec_id)
+		return raec_id
+	else:
+		raec_cache_stats['misses'] += 1
+		raec_id = get_node_aec_id(extend_aec(prefix, loc))
+		cache_global_raec(key, raec_id)
+		# An evicted RAEC is computed again, and may be a traversal point of an analyzed function by then
+		raec_func_map.setdefault(raec_id, frame_func(0))
 		return raec_id
 
+# Caches an RAEC relative to the global scope. If the cache is bounded, it is kept in two 
+# generations of half the size each; when the current one is full, it becomes the old one 
+# and the old one is evicted, so only entries not used for a whole generation are evicted.
+def cache_global_raec(key, raec_id):
+	global raec_cache_old
+	cache = raec_cache[0]
+	if raec_cache_size > 0 and len(cache) >= max(raec_cache_size / 2, 1):
+		raec_cache_stats['evictions'] += len(raec_cache_old)
+		raec_cache_old = cache
+		cache = raec_cache[0] = {}
+	cache[key] = raec_id
+
+# Evicts the cached RAECs relative to a frame, which are never needed again once it 
+# has been analyzed (only RAECs relative to the global scope outlive their frames)
+def evict_raecs(fid_bot):
+	aec_prefix_cache.pop(fid_bot, None)
+	cache = raec_cache.pop(fid_bot, None)
+	if cache is not None:
+		raec_cache_stats['evictions'] += len(cache)
+
 
 #################################
 # Detecting Traversals
@@ -628,53 +1397,213 @@ def get_raec(fid_bot, fid_top, loc):
 # An edge in the traversals computation has an Object ID as the source (may be Frame ID),
 # an Object ID as the destination (or a dummy value if the read value was a primitive),
 # and a 3-part label, consisting of:
-#  (i)   the field (offset) being read
+#  (i)   the memory location (source object and field) being read
 #  (ii)  the Acyclic Execution Context (AEC) identifier
 #  (iii) the actual value being read - this has some redundancy if the value read was an Object type,
 #          since the edge target has the same object ID as in the value label.
-Edge = namedtuple('Edge', ['srcObj', 'field', 'aec', 'val', 'dstObj'])
-
-# Compute traversals for the given activation record fid_bot and the computed read-trace
-def compute_traversals(fid_bot, read_set) :
-	heap_edges = []                      # [EDGE]
-	heap_aec_map = {}                    # AEC -> [EDGE]
-	ancestors = {}                       # OBJ -> [OBJ]
-	traversed_aecs = set()               # {AEC}
-	multi_traversed_aecs = set()         # {AEC}
-
-	# Returns whether an edge has a Frame ID as its source
-	def is_root(edge):
-		return is_root_obj(edge.srcObj)
-
-	# Convert each read in the read set to an edge in the read graph
+Edge = namedtuple('Edge', ['srcObj', 'mem', 'aec', 'val', 'dstObj'])
+
+# A read in an activation, resolved against the analyzer state at the time the activation is popped,
+# consisting of:
+#  (i)   the object (or frame) being read and the memory location being read
+#  (ii)  the AEC of the read relative to the activation
+#  (iii) the value being read, and the object ID of this value (or 0 if it is not an object)
+#  (iv)  whether the source is a root object, and if so the function of its frame (None for global scope)
+Read = namedtuple('Read', ['srcObj', 'mem', 'aec', 'val', 'dstObj', 'isRoot', 'rootFunc'])
+
+# Resolves the reads in the read-trace of activation record fid_bot and records their read/write AECs
+def resolve_reads(fid_bot, read_set):
+	reads = []
 	for (fid_top, loc, mem, val) in read_set:
 		# The source node is the object being read, and the field is part of the label
-		src, fld = mem
+		src = mem_obj(mem)
 		# The destination is the object ID if the value is an object, or a default value otherwise
 		typ, value = val
 		dst = int(value) if typ == 'O' else 0
 		# The Acyclic Execution Context (AEC) is the Acyclic Calling Context + Source Location of read
 		aec = get_raec(fid_bot, fid_top, loc)
 
+		# Map to read-AEC and last-write-AEC
+		read_aec = get_raec(0, fid_top, loc)
+		raec_read_map[aec].add(read_aec)
+		last_write_prefix, last_write_loc = last_write_locs[mem]
+		last_write_aec = get_global_raec(last_write_prefix, last_write_loc)
+		raec_write_map[aec].add(last_write_aec)
+
+		is_root = is_root_obj(src)
+		root_func = frame_func(src) if is_root else None
+		reads.append(Read(src, mem, aec, val, dst, is_root, root_func))
+	return reads
+
+# Analyzes the resolved reads of an activation, returning its traversed AECs, 
+# redundantly traversed AECs and access graph edges. This does not depend on
+# any global state, so it can be run in a worker process.
+def analyze_activation(reads):
+	traversed_aecs, redun_traversed_aecs = compute_traversals(reads)
+	ag_edges = compute_access_graph_edges(reads)
+	return traversed_aecs, redun_traversed_aecs, ag_edges
+
+# Merges the results of analyze_activation for an activation of func
+def merge_activation(func, analysis):
+	traversed_aecs, redun_traversed_aecs, ag_edges = analysis
+	changed = merge_access_graph(func, ag_edges, traversed_aecs, redun_traversed_aecs)
+	if convergence_window > 0:
+		record_convergence(func, changed)
+
+
+#################################
+# Sampling activations
+#################################
+
+# Global data
+max_activations = 0       # INT   // Maximum number of analyzed activations per function (0 for no limit)
+activation_rate = 1.0     # FLOAT // Probability that an activation is analyzed
+convergence_window = 0    # INT   // Number of consecutive activations of a function leaving its access graph 
+                          #          unchanged after which it is no longer analyzed (0 for never)
+activation_samples = {}   # FUNC -> ActivationSamples
+# Activations are sampled with a generator of their own, so that the samples of the report do not change
+activation_rng = random.Random("icse2017")
+
+class ActivationSamples(object):
+	__slots__ = ['activations', 'analyzed', 'pending', 'unchanged', 'converged']
+	def __init__(self):
+		self.activations = 0  # Activations which could have been analyzed
+		self.analyzed = 0     # Activations which were analyzed
+		self.pending = 0      # Analyzed activations not merged yet (with --convergence)
+		self.unchanged = 0    # Consecutive analyzed activations that left the access graph unchanged
+		self.converged = False
+
+	def reason(self):
+		if self.converged:
+			return "converged"
+		elif max_activations > 0 and self.analyzed >= max_activations:
+			return "capped"
+		else:
+			return "sampled"
+
+def is_sampling():
+	return max_activations > 0 or activation_rate < 1 or convergence_window > 0
+
+# Returns if an activation of func is analyzed, given the sampling limits
+def sample_activation(func):
+	samples = activation_samples.get(func)
+	if samples is None:
+		samples = activation_samples[func] = ActivationSamples()
+	samples.activations += 1
+	if convergence_window > 0 and analysis_pool is not None:
+		wait_for_convergence(samples)
+	if samples.converged or (max_activations > 0 and samples.analyzed >= max_activations):
+		return False
+	if activation_rate < 1 and activation_rng.random() >= activation_rate:
+		return False
+	samples.analyzed += 1
+	if convergence_window > 0:
+		samples.pending += 1
+	return True
+
+# Records whether an analyzed activation of func changed its access graph
+def record_convergence(func, changed):
+	samples = activation_samples[func]
+	samples.pending -= 1
+	if changed:
+		samples.unchanged = 0
+	else:
+		samples.unchanged += 1
+		if samples.unchanged >= convergence_window:
+			samples.converged = True
+
+# Returns the functions of which not all activations were analyzed, with their samples
+def sampled_funcs():
+	return sorted([(func, samples) for (func, samples) in activation_samples.iteritems() 
+		if samples.analyzed < samples.activations], key=lambda (func, samples): -samples.activations)
+
+# The ancestors of objects in an activation. When an object dst is read from an object src, 
+# the ancestors of src at that time (or src itself if it has none) and dst itself become 
+# ancestors of dst. Rather than copying sets of ancestors, each read creates a new version 
+# of dst that points to its previous version and to the current version of src, so that
+# the ancestors of an object are the objects of the versions reachable from its current one.
+class Ancestry(object):
+	__slots__ = ["versions", "nodes", "bare"]
+	def __init__(self):
+		self.versions = {}  # OBJ -> NODE // Current version of each object that has ancestors
+		self.nodes = []     # NODE -> (OBJ x NODE x NODE) // Object, previous version and source version
+		self.bare = {}      # OBJ -> NODE // Versions of objects without ancestors, which are only their own
+
+	def __contains__(self, obj):
+		return obj in self.versions
+
+	def newNode(self, obj, prev, via):
+		self.nodes.append((obj, prev, via))
+		return len(self.nodes) - 1
+
+	def addEdge(self, src, dst):
+		via = self.versions.get(src)
+		if via is None:
+			via = self.bare.get(src)
+			if via is None:
+				via = self.bare[src] = self.newNode(src, None, None)
+		prev = self.versions.get(dst)
+		if prev is None:
+			self.versions[dst] = self.newNode(dst, None, via)
+		elif self.nodes[prev][2] != via:
+			self.versions[dst] = self.newNode(dst, prev, via)
+
+	# Returns true if any of a set of objects has another one of them as an ancestor. This
+	# summarizes each version reachable from the objects by up to two of the objects among
+	# its ancestors, visiting each version once.
+	def hasRelated(self, objs):
+		summaries = {} # NODE -> (OBJ) 
+		for obj in objs:
+			if obj not in self.versions:
+				continue
+			stack = [self.versions[obj]]
+			while len(stack) > 0:
+				node = stack[-1]
+				if node in summaries:
+					stack.pop()
+					continue
+				(node_obj, prev, via) = self.nodes[node]
+				parents = [parent for parent in (prev, via) if parent is not None]
+				pending = [parent for parent in parents if parent not in summaries]
+				if len(pending) > 0:
+					stack.extend(pending)
+					continue
+				stack.pop()
+				summary = (node_obj,) if node_obj in objs else ()
+				for parent in parents:
+					for parent_obj in summaries[parent]:
+						if parent_obj not in summary:
+							summary += (parent_obj,)
+				# Every object is its own ancestor, so two of them means that one has another
+				if len(summary) > 1:
+					return True
+				summaries[node] = summary
+		return False
+
+# Compute traversals for an activation record given its resolved reads
+def compute_traversals(reads) :
+	heap_edges = []                      # [EDGE]
+	heap_aec_map = {}                    # AEC -> [EDGE]
+	ancestry = Ancestry()                # Ancestors of each object
+	traversed_aecs = set()               # {AEC}
+	multi_traversed_aecs = set()         # {AEC}
+
+	# Convert each read in the activation to an edge in the read graph
+	for read in reads:
+		src = read.srcObj
+		dst = read.dstObj
+		aec = read.aec
+
 		# Create an edge for traversal detection
-		edge = Edge(src, fld, aec, val, dst) 
+		edge = Edge(src, read.mem, aec, read.val, dst) 
 
 		# Populate ancestors of dst if dst is an object
 		# Note: This won't be accurate for cyclic graphs but should work for our purposes
 		if dst > 0:	
-			# Make sure there is an ancestor set for dst
-			if dst not in ancestors:
-				ancestors[dst] = set()
-			# Make sure that the src (and all its ancestors) are also ancestors of dst
-			if src in ancestors:
-				ancestors[dst].update(ancestors[src])
-			else:
-				ancestors[dst].add(src)
-			# Finally, every node is an ancestor of itself
-			ancestors[dst].add(dst)
+			ancestry.addEdge(src, dst)
 
 		# Optimization: Maintain only heap edges since stack edges cannot be traversed
-		if is_root(edge) :
+		if read.isRoot :
 			# fid = src, var = fld
 			pass # ??
 		else :
@@ -683,51 +1612,6 @@ def compute_traversals(fid_bot, read_set) :
 				heap_aec_map[aec] = []
 			heap_aec_map[aec].append(edge)
 
-		# Map to read-AEC and last-write-AEC
-		read_aec = get_raec(0, fid_top, loc)
-		raec_read_map[aec].add(read_aec)
-		last_write_fid, last_write_loc = last_write_locs[mem]
-		last_write_aec = get_raec(0, last_write_fid, last_write_loc)
-		raec_write_map[aec].add(last_write_aec)
-
-
-	# Returns true if o1 is an ancestor of o2 or vice versa
-	def path_exists(o1, o2):
-		return (o2 in ancestors and o1 in ancestors[o2]) or \
-			   (o1 in ancestors and o2 in ancestors[o1])
-
-
-	def is_traversal_by_ancestry(edges):
-		if len(edges) <= 1:
-			return False
-		mems = set()
-		for e in edges:
-			mems.add((e.srcObj, e.field))
-		if len(mems) <= 1:
-			return False
-		common_ancestors = set(ancestors.keys())
-		for e in edges:
-			obj = e.srcObj
-			if obj not in ancestors:
-				return False
-			common_ancestors &= ancestors[obj]
-			if len(common_ancestors) == 0:
-				return False
-		else:
-			return True
-
-	def is_traversal_by_connectivity(edges):		
-		for i in range(len(edges)):
-			if i > 100:  # FIXME! Bail-out early if it seems like traversal is unlikely
-				return False 
-			e1 = edges[i]
-			for j in range(i):
-				e2 = edges[j]
-				if (e1.srcObj != e2.srcObj or e1.field != e2.field) and path_exists(e1.srcObj, e2.srcObj):
-					return True
-		else:
-			return False
-
 
 	# Look for traversals in each AEC and collect candidate roots
 	for aec, edges in heap_aec_map.iteritems():
@@ -736,7 +1620,7 @@ def compute_traversals(fid_bot, read_set) :
 			continue
 
 
-		if not is_traversal_by_connectivity(edges):
+		if not is_traversal_by_connectivity(edges, ancestry):
 			continue
 
 
@@ -745,58 +1629,62 @@ def compute_traversals(fid_bot, read_set) :
 
 		# Now, try to determine if the traversal was redundant by looking at the sequence
 		# of memory locations de-referenced (and if this sequence repeats)
-		first_mem = (edges[0].srcObj, edges[0].field)
-		mem_sequences = []
-		fields_differ = False
-		for e in edges:
-			mem = (e.srcObj, e.field)
-			fields_differ |= (e.field != first_mem[1])
-			if mem == first_mem:
-				mem_sequences.append([])
-			mem_sequences[-1].append(mem)
-
-
-		# Sort sequences by length in descending order
-		mem_sequences = sorted(mem_sequences, key=len, reverse=True)
-		# Early cut-off if too few sequences
-		min_sequences = 2 if fields_differ else 3
-		min_non_trivial_sequences = 1 if fields_differ else 2
-		assert(min_sequences > min_non_trivial_sequences)
-		if len(mem_sequences) < min_sequences:
-			continue
-		for k in range(min_non_trivial_sequences):
-			if len(mem_sequences[k]) < 2:
-				break
-		else:
-			assert(len(mem_sequences[0]) > 1) # this is ensured because a traversal has at least two distinct mems
-			# If each sequence is a prefix of the first sequence, then we 
-			# have a repetition. Try to contradict this.
-			s1 = mem_sequences[0]
-			for k in range(1, len(mem_sequences)):
-				s2 = mem_sequences[k]
-				if not is_prefix(s2, s1):
-					break
-			else:
-				# If no break then all sequences are prefixes of the longest
-				# sequence, and hence this is a multi-traversal
-				multi_traversed_aecs.add(aec)
-				#print [str_mem((e.srcObj, e.field)) for e in edges]
-				#print "Redundant traversal at AEC " + str(aec) + " in clumps: " + ','.join(map(str, map(len, mem_sequences)))
+		if is_redundant_traversal(edges):
+			multi_traversed_aecs.add(aec)
 		
 
 	return traversed_aecs, multi_traversed_aecs 
 
 
 
-# A function to determine if seq1 is a prefix of seq2
-def is_prefix(seq1, seq2):
-	if len(seq1) > len(seq2):
-		return False
-	for i in range(len(seq1)):
-		if not seq1[i] == seq2[i]:
-			return False
-	else:
-		return True
+# Returns true if two edges read different memory locations of objects where one is an
+# ancestor of the other (or of the same object). Rather than comparing all pairs of edges,
+# this looks up the ancestors of the distinct source objects among each other.
+def is_traversal_by_connectivity(edges, ancestry):
+	src_mems = {} # OBJ -> MEM // The first memory location read from each source object
+	for e in edges:
+		src = e.srcObj
+		if src not in src_mems:
+			src_mems[src] = e.mem
+		elif src_mems[src] != e.mem and src in ancestry:
+			return True
+	return ancestry.hasRelated(set(src_mems))
+
+# Returns true if the memory locations read by the edges of a traversal are a repeated
+# sequence. The edges are split into sequences that start at each read of the first memory
+# location, and each sequence must be a prefix of the longest one. This is checked in one pass
+# by comparing each sequence with the longest one before it (a slice of the edges), which it
+# must either be a prefix of or extend.
+def is_redundant_traversal(edges):
+	first_mem = edges[0].mem
+	first_field = mem_field(first_mem)
+	fields_differ = False
+	num_sequences = 0
+	num_non_trivial_sequences = 0  # Sequences of at least two memory locations
+	start = 0                      # Index of the first edge of the current sequence
+	longest_start = 0              # Index of the first edge of the longest sequence so far
+	longest_len = 0
+	for i in xrange(len(edges)):
+		mem = edges[i].mem
+		fields_differ |= (mem_field(mem) != first_field)
+		if mem == first_mem:
+			num_sequences += 1
+			start = i
+		pos = i - start
+		if pos == 1:
+			num_non_trivial_sequences += 1
+		if pos < longest_len:
+			if mem != edges[longest_start + pos].mem:
+				return False
+		else:
+			longest_start = start
+			longest_len = pos + 1
+
+	# Too few sequences (or too few non-trivial ones) are not a repetition
+	min_sequences = 2 if fields_differ else 3
+	min_non_trivial_sequences = 1 if fields_differ else 2
+	return num_sequences >= min_sequences and num_non_trivial_sequences >= min_non_trivial_sequences
+
 
 #################################
 # Access Graphs
@@ -804,6 +1692,7 @@ def is_prefix(seq1, seq2):
 
 # Global data
 func_ag_map = {} # FUNC -> AG // A map of functions to their access graphs
+ordered_access_graphs = False # BOOL // Whether access graphs keep their functions, nodes and edges in creation order (see run_shard)
 
 # Helper function for quoting strings 
 # (assuming they don't contain quotes themselves; 
@@ -817,7 +1706,7 @@ def get_access_graph(func):
 	if func in func_ag_map:
 		ag = func_ag_map[func]
 	else:
-		nodes = {}    # (AEC|FunctionLoc|$) -> Node
+		nodes = collections.OrderedDict() if ordered_access_graphs else {} # (AEC|FunctionLoc|$) -> Node
 		roots = []    # [Node]
 		ag = (nodes, roots)
 		func_ag_map[func] = ag
@@ -829,16 +1718,21 @@ class AccessGraphNode(object):
 		self.idx = idx
 		self.name = name
 		self.label = label
-		self.edgeTo = dict() # DST_NODE x LABEL
+		self.edgeTo = collections.OrderedDict() if ordered_access_graphs else dict() # DST_NODE x LABEL
 		self.marked = False
 		self.maxCount = 0
 
+	# Edges are labeled by fields, which are resolved to strings only when the access graph is output.
+	# Returns whether the edge is new or its label has changed.
 	def addEdge(self, dst_idx, label):
-		# If there is an edge to same dest with different label, merge them
-		if dst_idx in self.edgeTo and self.edgeTo[dst_idx] != label:
-			self.edgeTo[dst_idx] = '(*)'
-		else:
+		if dst_idx not in self.edgeTo:
 			self.edgeTo[dst_idx] = label
+			return True
+		# If there is an edge to same dest with different label, merge them
+		if self.edgeTo[dst_idx] != label and self.edgeTo[dst_idx] != AG_MERGED_LABEL:
+			self.edgeTo[dst_idx] = AG_MERGED_LABEL
+			return True
+		return False
 
 	def iterEdges(self):
 		return self.edgeTo.iteritems()
@@ -854,6 +1748,12 @@ class AccessGraphNode(object):
 		if count > self.maxCount:
 			self.maxCount = count
 
+	def getName(self):
+		return self.name
+
+	def getLabel(self):
+		return self.label
+
 
 class AccessGraphRootNode(AccessGraphNode):
 	__slots__ = ['pathPrefix']
@@ -861,6 +1761,9 @@ class AccessGraphRootNode(AccessGraphNode):
 		AccessGraphNode.__init__(self, idx, name, label)
 		self.pathPrefix = None
 
+	def getPathPrefix(self):
+		return self.pathPrefix
+
 class AccessGraphFuncNode(AccessGraphRootNode):
 	def __init__(self, func):
 		idx = func
@@ -868,15 +1771,19 @@ class AccessGraphFuncNode(AccessGraphRootNode):
 		name = quote(label)
 		AccessGraphRootNode.__init__(self, idx, name, label)
 
+	def getPathPrefix(self):
+		return '('+str_loc(self.idx,full=True)+')'
+
 class AccessGraphVarNode(AccessGraphNode):
-	# var : FUNC x FIELD
+	# var : FUNC x FIELD, whose field is resolved to a string only when the access graph is output
 	def __init__(self, var):
-		func = var[0]
-		fld = var[1]
-		idx = var
-		label = string(fld)# + '@' + str_func(func)
-		name = quote(label)
-		AccessGraphNode.__init__(self, idx, name, label)
+		AccessGraphNode.__init__(self, var, None, None)
+
+	def getName(self):
+		return quote(self.getLabel())
+
+	def getLabel(self):
+		return string(self.idx[1])# + '@' + str_func(func)
 
 class AccessGraphAecNode(AccessGraphNode):
 	__slots__ = ['aec', 'traversed', 'redundant']
@@ -887,11 +1794,19 @@ class AccessGraphAecNode(AccessGraphNode):
 		self.traversed = False
 		self.redundant = False
 
-# Construct and/or merge-into access graphs for an activation
-def compute_access_graphs(func, fid_bot, read_set, traversed_aecs, redun_traversed_aecs):
-	# Get the access graph for this function or create one
-	nodes, roots = get_access_graph(func)
+# Kinds of access graph edges computed for an activation
+AG_AEC_EDGE = 0     # From the node where an object was last seen to an AEC node
+AG_FUNC_EDGE = 1    # From a function node to a local variable node
+AG_GLOBAL_EDGE = 2  # From the global root node to a global variable node
+AG_MERGED_LABEL = None  # Label of an edge which merges edges with different fields
 
+# Returns the string representation of an access graph edge label
+def str_edge_label(label):
+	return '(*)' if label is AG_MERGED_LABEL else string(label)
+
+# Compute the access graph edges for an activation given its resolved reads, as a 
+# sequence of (KIND, SRC_IDX, DST_IDX, FIELD), without touching any access graph
+def compute_access_graph_edges(reads):
 	# Root idx/name referring to global vars
 	root_idx = 'global' 
 
@@ -899,6 +1814,57 @@ def compute_access_graphs(func, fid_bot, read_set, traversed_aecs, redun_travers
 	# good estimate for the referrer
 	last_seen = {}  # OBJ -> AEC
 
+	ag_edges = []
+
+	# Process read-events sequentially
+	for read in reads:
+		# Extract the object being read and the field being de-referenced
+		obj = read.srcObj
+		fld = mem_field(read.mem)
+		# Extract the value being read
+		typ, value = read.val
+		if typ == 'O':
+			res = read.dstObj
+		else:
+			res = None
+
+		# The Acyclic Execution Context (AEC) is the Acyclic Calling Context + Source Location of read
+		aec = read.aec
+		# Add an edge from AEC where obj was last-seen or else root to this AEC
+		if obj in last_seen:
+			kind = AG_AEC_EDGE
+			src_idx = last_seen[obj]
+			dst_idx = aec
+		elif read.isRoot:
+			# Try to find func for the source (else probably a global)
+			if read.rootFunc is not None:
+				func = read.rootFunc
+				kind = AG_FUNC_EDGE
+				src_idx = func
+				dst_idx = (func, fld)
+			else:
+				kind = AG_GLOBAL_EDGE
+				src_idx = root_idx
+				dst_idx = ((0,0), fld)
+		else:
+			continue
+
+		# Map the result to be last seen at the destination node of the edge
+		# Note: This is done late so that if there is a trivial cycle (OBJ.FLD == OBJ)
+		# then last_seen accessed above should first handle the read and then the write
+		# should update the last_seen
+		if res is not None:
+			last_seen[res] = dst_idx
+
+		ag_edges.append((kind, src_idx, dst_idx, fld))
+
+	return ag_edges
+
+# Merge the access graph edges of an activation into the access graph of its function
+def merge_access_graph(func, ag_edges, traversed_aecs, redun_traversed_aecs):
+	# Get the access graph for this function or create one
+	nodes, roots = get_access_graph(func)
+
 	# Counter for aec nodes seen in this activation
 	aec_counts = defaultdict(int)
 
@@ -911,8 +1877,6 @@ def compute_access_graphs(func, fid_bot, read_set, traversed_aecs, redun_travers
 		else:
 			node = nodes[aec]
 		aec_counts[aec] += 1
-		node.traversed = node.traversed or aec in traversed_aecs
-		node.redundant = node.redundant or aec in redun_traversed_aecs
 		return node
 
 	# Helper function to create or retrieve a function node
@@ -920,7 +1884,6 @@ def compute_access_graphs(func, fid_bot, read_set, traversed_aecs, redun_travers
 		# If no node exists for this func, create one
 		if func not in nodes:
 			node = AccessGraphFuncNode(func)
-			node.pathPrefix = '('+str_loc(func,full=True)+')'
 			nodes[func] = node
 			roots.append(node)  
 		else:
@@ -928,7 +1891,7 @@ def compute_access_graphs(func, fid_bot, read_set, traversed_aecs, redun_travers
 		return node
 
 	# Helper function to create or retrieve root node
-	def get_root_node():
+	def get_root_node(root_idx):
 		if root_idx not in nodes:
 			root_node = AccessGraphRootNode(root_idx, root_idx, root_idx)
 			root_node.pathPrefix = '<global>'
@@ -948,104 +1911,467 @@ def compute_access_graphs(func, fid_bot, read_set, traversed_aecs, redun_travers
 			node = nodes[var]
 		return node
 
-	# Process read-events sequentially
-	for (fid_top, loc, mem, val) in read_set:
-		# Extract the object being read and the field being de-referenced
-		obj, fld = mem
-		# Extract the value being read
-		typ, value = val
-		if typ == 'O':
-			res = int(value)
+	# Create edges from source to destination in order
+	num_nodes = len(nodes)
+	changed = False
+	for (kind, src_idx, dst_idx, fld) in ag_edges:
+		if kind == AG_AEC_EDGE:
+			src_node = nodes[src_idx]
+			get_aec_node(dst_idx)
+		elif kind == AG_FUNC_EDGE:
+			src_node = get_func_node(src_idx)
+			get_var_node(dst_idx)
 		else:
-			res = None
+			src_node = get_root_node(src_idx)
+			get_var_node(dst_idx)
+		changed = src_node.addEdge(dst_idx, fld) or changed
 
-		# The Acyclic Execution Context (AEC) is the Acyclic Calling Context + Source Location of read
-		aec = get_raec(fid_bot, fid_top, loc)
-		# Add an edge from AEC where obj was last-seen or else root to this AEC
-		label = string(fld)
-		if obj in last_seen:
-			last_seen_idx = last_seen[obj]
-			src_idx = last_seen_idx
-			src_node = nodes[last_seen_idx]
-			dst_idx = aec
-			dst_node = get_aec_node(aec)
-		elif is_root_obj(obj):
-			# Try to find func for the source (else probably a global)
-			if obj in fid_func_map:
-				func = fid_func_map[obj]
-				src_idx = func
-				src_node = get_func_node(func)
-				var = (func, fld)
-				dst_idx = var
-				dst_node = get_var_node(var)
-			else:
-				src_idx = root_idx
-				src_node = get_root_node()
-				var = ((0,0), fld)
-				dst_idx = var
-				dst_node = get_var_node(var)
-		else:
-			continue
+	# Update AEC max-counts and traversal flags
+	for aec in aec_counts.iterkeys():
+		node = nodes[aec]
+		node.updateMaxCount(aec_counts[aec])
+		traversed = aec in traversed_aecs
+		redundant = aec in redun_traversed_aecs
+		if (traversed and not node.traversed) or (redundant and not node.redundant):
+			changed = True
+		node.traversed = node.traversed or traversed
+		node.redundant = node.redundant or redundant
 
-		# Map the result to be last seen at the destination node of the edge
-		# Note: This is done late so that if there is a trivial cycle (OBJ.FLD == OBJ)
-		# then last_seen accessed above should first handle the read and then the write
-		# should update the last_seen
-		if res is not None:
-			last_seen[res] = dst_idx
+	# Whether the access graph has changed, apart from max-counts (see record_convergence)
+	return changed or len(nodes) != num_nodes
 
 
-		# Create edge from source to destination
-		src_node.addEdge(dst_idx, label)
+#################################
+# Offloading analysis to workers
+#################################
 
-	# Update AEC max-counts
-	for aec in aec_counts.iterkeys():
-		nodes[aec].updateMaxCount(aec_counts[aec])
+# Global data
+analysis_pool = None            # Pool of worker processes, if enabled
+analysis_batch = []             # [(FUNC, [READ])]   // Activations not yet submitted to the pool
+analysis_batch_reads = 0        # INT                // Number of reads in analysis_batch
+pending_analyses = collections.deque() # [([FUNC], RESULT)] // Batches submitted, in trace order
+
+# Activations are submitted in batches to amortize inter-process communication
+batch_max_reads = 10000
+batch_max_activations = 1000
+# Maximum number of batches in flight before the trace scan waits for workers
+max_pending_batches = 64
+
+def start_analysis_pool(workers):
+	global analysis_pool
+	analysis_pool = multiprocessing.Pool(workers)
+
+# Queues the resolved reads of an activation of func for analysis in a worker
+def submit_activation(func, reads):
+	global analysis_batch_reads
+	analysis_batch.append((func, reads))
+	analysis_batch_reads += len(reads)
+	if analysis_batch_reads >= batch_max_reads or len(analysis_batch) >= batch_max_activations:
+		submit_batch()
+	merge_analyses(wait=len(pending_analyses) >= max_pending_batches)
+
+def submit_batch():
+	global analysis_batch, analysis_batch_reads
+	if len(analysis_batch) > 0:
+		funcs = [func for (func, reads) in analysis_batch]
+		batch_reads = [reads for (func, reads) in analysis_batch]
+		pending_analyses.append((funcs, analysis_pool.apply_async(analyze_batch, (batch_reads,))))
+		analysis_batch = []
+		analysis_batch_reads = 0
+
+# Runs in a worker process
+def analyze_batch(batch_reads):
+	return map(analyze_activation, batch_reads)
+
+# Merges analyzed batches in the order they were submitted; if wait is set then 
+# waits for at least the oldest batch, else merges only batches that are ready
+def merge_analyses(wait=False):
+	while len(pending_analyses) > 0 and (wait or pending_analyses[0][1].ready()):
+		funcs, result = pending_analyses.popleft()
+		for func, analysis in itertools.izip(funcs, result.get()):
+			merge_activation(func, analysis)
+		wait = False
+
+# With workers, activations are merged later than they are sampled, so that whether a function 
+# has converged is only known for its merged activations. Its activations in flight are bounded
+# by the convergence window, by waiting for them to be merged, so that at most that many more 
+# activations are analyzed after it has converged than without workers.
+def wait_for_convergence(samples):
+	if samples.pending >= convergence_window and not samples.converged:
+		submit_batch()
+		while samples.pending >= convergence_window and not samples.converged:
+			merge_analyses(wait=True)
+
+# Submits any remaining activations and waits for all of them to be merged
+def drain_analysis_pool():
+	if analysis_pool is not None:
+		submit_batch()
+		while len(pending_analyses) > 0:
+			merge_analyses(wait=True)
+
+# Drains and shuts down the pool
+def finish_analysis_pool():
+	global analysis_pool
+	if analysis_pool is not None:
+		drain_analysis_pool()
+		analysis_pool.close()
+		analysis_pool.join()
+		analysis_pool = None
 
 
+#################################
+# Checkpoints
+#################################
+
+# Global variables that make up the state of the analysis. The liveness map last_reads 
+# does not change after the pre-pass, so it is saved separately and only once.
+checkpoint_globals = ['line', 'total_frames_analyzed', 'set_funcs_analyzed',
+	'read_sets_stack', 'write_sets_stack', 'last_write_locs', 'fid_stack', 'declarations_stack', 
+	'fid_frame_map', 'frame_refs', 'frame_holds', 'frame_expiries', 'func_frames_map', 'aec_prefix_cache', 
+	'aec_trie', 'aec_trie_tab', 'aec_node_map', 'aec_tab', 'raec_cache', 'raec_cache_old', 'raec_cache_stats', 
+	'raec_func_map', 'raec_read_map', 'raec_write_map', 'root_objects', 'func_ag_map', 'activation_samples', 
+	'activation_rng']
+
+# Returns the options which shape the state of the analysis, which must be the same to resume from a checkpoint
+def checkpoint_options():
+	return {'--focus': (focus, sorted(focus_funcs), focus_files, focus_aecs), 
+		'--raec_cache_size': raec_cache_size, 
+		'--max_activations': max_activations, '--activation_rate': activation_rate, '--convergence': convergence_window, 
+		'TRAVIOLI_EXCLUDE_PATTERN': exclude_pattern.pattern}
+
+# Returns the size of a trace file, used to check that a checkpoint belongs to it
+def trace_size(trace_file):
+	return os.path.getsize(trace_file)
+
+def liveness_file(checkpoint_file):
+	return checkpoint_file + '.liveness'
+
+# Writes a compressed pickle atomically, so that a crash never leaves a partial file behind
+def dump_compressed(obj, file_name):
+	tmp_file_name = file_name + '.tmp'
+	with gzip.open(tmp_file_name, 'wb', compresslevel=1) as f:
+		cPickle.dump(obj, f, cPickle.HIGHEST_PROTOCOL)
+	os.rename(tmp_file_name, file_name)
+
+def load_compressed(file_name):
+	with gzip.open(file_name, 'rb') as f:
+		return cPickle.load(f)
+
+# Saves the result of the liveness pre-pass
+def save_liveness(checkpoint_file, trace_file, total_lines):
+	dump_compressed((trace_size(trace_file), total_lines, last_reads), liveness_file(checkpoint_file))
+
+# Saves the state of the analysis along with the trace position (byte offset) of the next event
+def save_checkpoint(checkpoint_file, trace_file, total_lines, position):
+	# Activations being analyzed by workers must be merged first
+	drain_analysis_pool()
+	state = dict((name, globals()[name]) for name in checkpoint_globals)
+	dump_compressed((trace_size(trace_file), checkpoint_options(), position, state), checkpoint_file)
+
+# Restores the state of the analysis and returns the total lines and the trace position to resume from
+def load_checkpoint(checkpoint_file, trace_file):
+	global last_reads
+	(size, options, position, state) = load_compressed(checkpoint_file)
+	(liveness_size, total_lines, last_reads) = load_compressed(liveness_file(checkpoint_file))
+	if size != trace_size(trace_file) or liveness_size != size:
+		raise RuntimeError("Checkpoint " + checkpoint_file + " does not belong to trace " + trace_file)
+	current_options = checkpoint_options()
+	changed = sorted(name for name in options if options[name] != current_options[name])
+	if len(changed) > 0:
+		raise RuntimeError("Checkpoint " + checkpoint_file + " was saved with different " + ", ".join(changed) + 
+			" and cannot be resumed with the current ones")
+	globals().update(state)
+	return total_lines, position
+
+def remove_checkpoint(checkpoint_file):
+	for file_name in [checkpoint_file, checkpoint_file + '.tmp', liveness_file(checkpoint_file)]:
+		if os.path.exists(file_name):
+			os.remove(file_name)
+
+
+#################################
+# Sharding by top-level calls
+#################################
+
+# A trace is split into shards that begin at calls made from the top-level frame. The main
+# process scans the trace once, tracking only the state that analysis of later events depends
+# on (frame stacks, last writes and root objects), and forks a process at the start of each 
+# shard which inherits this state and analyzes the shard. Since analysis of an activation 
+# only uses its own read-set, the access graphs and AEC maps of the shards are merged in 
+# trace order to get the same results as analyzing the whole trace in one process.
+
+# Number of shards per process, so that shards of uneven cost can be balanced
+shards_per_process = 4
+
+# Analyzes a trace in shards using the given number of processes concurrently
+def analyze_shards(trace_file, total_lines, processes):
+	global line
+	binary = tracefmt.is_binary_trace(trace_file)
+	shard_lines = max(1, total_lines // (processes * shards_per_process))
+	running = collections.deque() # [(PROCESS, CONNECTION)] // Shards being analyzed, in trace order
+
+	# Forks a process to analyze a shard starting at position, after start_line lines of the trace
+	def start_shard(position, start_line):
+		if len(running) >= processes:
+			merge_shard(*running.popleft())
+		receiver, sender = multiprocessing.Pipe(False)
+		process = multiprocessing.Process(target=run_shard, 
+			args=(sender, trace_file, binary, position, start_line, shard_lines))
+		process.start()
+		sender.close()
+		running.append((process, receiver))
+
+	# Scan the trace, starting a new shard at the first top-level call after every shard_lines lines
+	with ProgressBar(max_value=total_lines) as pb:
+		line = 0
+		limit = 0
+		if binary:
+			for (block_pos, _, (kinds, types, fields, values)) in tracefmt.iter_blocks_with_offsets(trace_file):
+				for i in xrange(len(kinds)):
+					kind = kinds[i]
+					if line >= limit and kind == "C" and len(fid_stack) == 1:
+						start_shard((block_pos, i), line)
+						limit = line + shard_lines
+					track_event(kind, [f[i] for f in fields])
+					line = line + 1
+				pb.update(line)
+		else:
+			with open(trace_file, 'rb') as trace_csv:
+				pos = 0
+				for raw_row in trace_csv:
+					# Trace fields never contain quotes or commas, so splitting is the same as csv.reader
+					row = raw_row.rstrip('\r\n').split(',')
+					kind = row[0]
+					if line >= limit and kind == "C" and len(fid_stack) == 1:
+						start_shard(pos, line)
+						limit = line + shard_lines
+					track_event(kind, map(int, row[1:1+tracefmt.int_fields[kind]]))
+					line = line + 1
+					pos += len(raw_row)
+					if line % 1e3 == 0:
+						pb.update(line)
+		if line == 0:
+			start_shard(0 if not binary else (len(tracefmt.MAGIC), 0), 0)
+
+	while len(running) > 0:
+		merge_shard(*running.popleft())
+
+# Tracks the state needed by later shards for one event, given its kind and integer fields.
+# This mirrors the effects of the handle_* functions on fid_stack, fid_frame_map, frame_refs,
+# last_write_locs and root_objects.
+def track_event(kind, fields):
+	if kind == "R":
+		root_objects.add(fields[2])
+	elif kind == "W":
+		(sid, iid, fid, offset) = fields[:4]
+		mem = make_mem(fid, offset)
+		track_write(mem, make_loc(sid, iid), 0)
+		hold_frame(mem)
+		root_objects.add(fid)
+	elif kind == "P":
+		(sid, iid, rid, oid, offset) = fields[:5]
+		loc = make_loc(sid, iid)
+		track_write(make_mem(oid, offset), loc, 0)
+		if rid != oid:
+			track_write(make_mem(rid, offset), loc, 0)
+	elif kind == "C":
+		(sid, iid, func_sid, func_iid, func_oid, fid) = fields[:6]
+		add_frame(fid, make_loc(sid, iid), make_loc(func_sid, func_iid))
+	elif kind == "E":
+		(fid, _, _) = remove_frame()
+		release_frame(fid)
+		release_expired_frames()
+	elif kind == "D":
+		(sid, iid, fid, offset) = fields[:4]
+		mem = make_mem(fid, offset)
+		track_write(mem, make_loc(sid, iid), 1)
+		hold_frame(mem)
+
+def track_write(mem, loc, depth):
+	if mem is not None:
+		fid, _, _ = peek_fid(depth)
+		last_write_locs[mem] = (fid_frame_map[fid][4], loc)
+
+# Runs in a forked process: analyzes the shard starting at position (after start_line lines of the
+# trace) up to the first top-level call after shard_lines lines, and sends back the results
+def run_shard(conn, trace_file, binary, position, start_line, shard_lines):
+	global line, total_frames_analyzed, func_ag_map, ordered_access_graphs
+	try:
+		# Start with empty results, since the results inherited from the main process are merged already
+		aec_base = len(aec_tab)
+		raec_func_map.clear()
+		raec_read_map.clear()
+		raec_write_map.clear()
+		# Keep the access graphs in creation order, so that merging them in trace order creates 
+		# their functions, nodes and edges in the same order as analyzing the whole trace would
+		func_ag_map = collections.OrderedDict()
+		ordered_access_graphs = True
+		total_frames_analyzed = 0
+		set_funcs_analyzed.clear()
+		raec_cache_stats.update(dict.fromkeys(raec_cache_stats, 0))
+
+		line = start_line
+		limit = start_line + shard_lines
+		if binary:
+			analyze_binary_shard(trace_file, position, limit)
+		else:
+			with open(trace_file, 'rb') as trace_csv:
+				trace_csv.seek(position)
+				for row in csv.reader(trace_csv):
+					if line >= limit and row[0] == "C" and len(fid_stack) == 1:
+						break
+					line = line + 1
+					handle_row(row)
+
+		conn.send((aec_base, [get_aec_seq(aec) for aec in xrange(aec_base, len(aec_tab))], raec_func_map, raec_read_map, raec_write_map, 
+			func_ag_map, total_frames_analyzed, set_funcs_analyzed, raec_cache_stats))
+	except:
+		conn.send(traceback.format_exc())
+	conn.close()
+
+def analyze_binary_shard(trace_file, position, limit):
+	(block_pos, start) = position
+	for block in tracefmt.iter_blocks(trace_file, block_pos):
+		kinds = block.kinds
+		i = start
+		start = 0
+		if line < limit:
+			stop = min(len(kinds), i + limit - line)
+			handle_block(block, i, stop)
+			i = stop
+		while i < len(kinds):
+			if kinds[i] == "C" and len(fid_stack) == 1:
+				return
+			handle_block(block, i, i+1)
+			i = i + 1
+
+# Waits for a shard process to finish and merges its results
+def merge_shard(process, conn):
+	global total_frames_analyzed
+	try:
+		result = conn.recv()
+	except EOFError:
+		result = "Shard process exited with code " + str(process.exitcode)
+	process.join()
+	if isinstance(result, str):
+		raise RuntimeError("Analysis of shard failed:\n" + result)
+	(aec_base, shard_aec_seqs, shard_raec_func_map, shard_raec_read_map, shard_raec_write_map, 
+		shard_func_ag_map, shard_frames_analyzed, shard_funcs_analyzed, shard_raec_cache_stats) = result
+
+	# Re-number the shard's new AECs in the order it created them, which is trace order
+	aec_ids = range(aec_base) + [get_aec_id(seq) for seq in shard_aec_seqs]
+	def aec_id(idx):
+		return aec_ids[idx] if isinstance(idx, (int, long)) else idx
+
+	for raec, func in shard_raec_func_map.iteritems():
+		raec_func_map[aec_ids[raec]] = func
+	for raec, aecs in shard_raec_read_map.iteritems():
+		raec_read_map[aec_ids[raec]].update(aec_ids[aec] for aec in aecs)
+	for raec, aecs in shard_raec_write_map.iteritems():
+		raec_write_map[aec_ids[raec]].update(aec_ids[aec] for aec in aecs)
+
+	# The shard's functions, nodes and edges are in creation order (see run_shard), in which new ones are added
+	for func, (shard_nodes, shard_roots) in shard_func_ag_map.iteritems():
+		nodes, roots = get_access_graph(func)
+		adopted = set() # {INT} // Identities of the shard's nodes added to the access graph
+		for shard_node in shard_nodes.itervalues():
+			idx = aec_id(shard_node.idx)
+			edges = [(aec_id(dst_idx), label) for (dst_idx, label) in shard_node.iterEdges()]
+			if idx in nodes:
+				# Merge into the existing node
+				node = nodes[idx]
+				node.updateMaxCount(shard_node.maxCount)
+				if isinstance(node, AccessGraphAecNode):
+					node.traversed = node.traversed or shard_node.traversed
+					node.redundant = node.redundant or shard_node.redundant
+				for (dst_idx, label) in edges:
+					node.addEdge(dst_idx, label)
+			else:
+				# Adopt the shard's node with re-numbered AECs
+				node = shard_node
+				if isinstance(node, AccessGraphAecNode):
+					node.idx = node.aec = idx
+					node.name = node.label = str(idx)
+				node.edgeTo = dict(edges)
+				nodes[idx] = node
+				adopted.add(id(node))
+		# New roots are appended in the order the shard created them
+		for shard_root in shard_roots:
+			if id(shard_root) in adopted:
+				roots.append(shard_root)
+
+	total_frames_analyzed += shard_frames_analyzed
+	for stat, count in shard_raec_cache_stats.iteritems():
+		raec_cache_stats[stat] += count
+	set_funcs_analyzed.update(shard_funcs_analyzed)
+
+
+# Dumps access graphs and collects the traversed data structures of functions in parallel
+# processes, which inherit the access graphs when forked. Yields the results of each
+# function in order (see output_access_graph).
+def output_access_graphs(funcs, parent_dir, jobs):
+	tasks = [(func, parent_dir) for func in funcs]
+	if jobs > 1 and len(tasks) > 1:
+		pool = multiprocessing.Pool(min(jobs, len(tasks)))
+		for result in pool.imap(output_access_graph, tasks, chunksize=16):
+			yield result
+		pool.close()
+		pool.join()
+	else:
+		for result in itertools.imap(output_access_graph, tasks):
+			yield result
+
+# Dumps the access graph of a function and returns it along with its traversed data structures
+def output_access_graph(task):
+	(func, parent_dir) = task
+	dot_access_graphs(func, parent_dir)
+	return func, collect_traversed_data_structures(func)
+
 # Dump access graph for a function to a DOT file
 def dot_access_graphs(func, parent_dir):
 	# Get access graph for this function
 	nodes, roots = get_access_graph(func)
 
-	# Dump access graphs to dot files
+	# Lines of the DOT file, which is written at once
+	dot_lines = ['digraph access_graph {\n', 'rankdir="LR"\n', 'node [style="filled"]\n']
+	# Print graph nodes in GraphViz format
+	for key, node in nodes.items():
+		if isinstance(node, AccessGraphAecNode) and node.redundant:
+			fillcolor = 'black'
+			fontcolor = 'white'
+		elif isinstance(node, AccessGraphAecNode) and node.traversed:
+			fillcolor = 'grey'
+			fontcolor = 'black'
+		elif isinstance(node, AccessGraphRootNode):
+			continue # Disable rendering of nodes
+		else:
+			fillcolor = 'white'
+			fontcolor = 'black'
+		node_name = node.getName()
+		node_label = node.getLabel()
+		dot_lines.append(node_name + ' [fillcolor="' + fillcolor + '", fontcolor="' + fontcolor + '", label = "' + node_label + '"]\n')
+
+		# Print graph edges in GraphViz format
+		for dst_idx, edge_label in node.iterEdges():
+			src_node = node
+			dst_node = nodes[dst_idx]
+			src_name = src_node.getName()
+			dst_name = dst_node.getName()
+			dot_lines.append(src_name + ' -> ' + dst_name + ' [label = "' + str_edge_label(edge_label) + '"]\n')
+	dot_lines.append('}\n')
+
 	dot_file_name = parent_dir + '/ag_' + str_loc(func, full=False) + '.dot'
 	with open(dot_file_name, 'w') as dot_file:
-		dot_file.write('digraph access_graph {\n')
-		dot_file.write('rankdir="LR"\n')
-		dot_file.write('node [style="filled"]\n')
-		# Print graph nodes in GraphViz format
-		for key, node in nodes.items():
-			if isinstance(node, AccessGraphAecNode) and node.redundant:
-				fillcolor = 'black'
-				fontcolor = 'white'
-			elif isinstance(node, AccessGraphAecNode) and node.traversed:
-				fillcolor = 'grey'
-				fontcolor = 'black'
-			elif isinstance(node, AccessGraphRootNode):
-				continue # Disable rendering of nodes
-			else:
-				fillcolor = 'white'
-				fontcolor = 'black'
-			node_name = node.name
-			node_label = node.label
-			dot_file.write(node_name + ' [fillcolor="' + fillcolor + '", fontcolor="' + fontcolor + '", label = "' + node_label + '"]\n')
-
-			# Print graph edges in GraphViz format
-			for dst_idx, edge_label in node.iterEdges():
-				src_node = node
-				dst_node = nodes[dst_idx]
-				src_name = src_node.name
-				dst_name = dst_node.name
-				dot_file.write(src_name + ' -> ' + dst_name + ' [label = "' + edge_label + '"]\n')
-		dot_file.write('}\n')
+		dot_file.write(''.join(dot_lines))
 
 
 # Traverse access graphs for a function from the root node(s) to 
-# determine the root access paths and collect traversal infos
-def collect_traversed_data_structures(func, traversal_infos):
+# determine the root access paths, and return the traversed data structures 
+# as a list of (PATH x [AEC x REDUNDANT x MAX_COUNT]) in the order they are found
+def collect_traversed_data_structures(func):
 	# Get access graph for this function
 	nodes, roots = get_access_graph(func)
+	traversed = []
 
 	def collect_traversed_aecs(aec_node, traversal_info):
 		# Don't process the same node more than once
@@ -1053,7 +2379,7 @@ def collect_traversed_data_structures(func, traversal_infos):
 			with aec_node:
 				# Collect traversal info regarding AEC
 				if aec_node.traversed:
-					traversal_info.addAecNode(aec_node)
+					traversal_info.append((aec_node.aec, aec_node.redundant, aec_node.maxCount))
 				for dst_idx, label in aec_node.iterEdges():
 					dst_node = nodes[dst_idx]
 					collect_traversed_aecs(dst_node, traversal_info)
@@ -1068,17 +2394,26 @@ def collect_traversed_data_structures(func, traversal_infos):
 					# If child-edge is a traversal, collect info for this access path and don't recurse further
 					if isinstance(dst_node, AccessGraphAecNode) and dst_node.traversed:
 						path_str = '.'.join(path)
-						info = traversal_infos[path_str]
-						info.addFunc(func)
+						info = []
+						traversed.append((path_str, info))
 						collect_traversed_aecs(dst_node, info)
 					else:
 						# Otherwise recursive into destination node with new access path
-						process_traversed_paths(dst_node, path + [label])
+						process_traversed_paths(dst_node, path + [str_edge_label(label)])
 
 
 	# Process and print info
 	for root_node in roots:
-		process_traversed_paths(root_node, [root_node.pathPrefix])
+		process_traversed_paths(root_node, [root_node.getPathPrefix()])
+	return traversed
+
+# Merges the traversed data structures of a function into the traversal infos
+def merge_traversed_data_structures(func, traversed, traversal_infos):
+	for (path, aecs) in traversed:
+		info = traversal_infos[path]
+		info.addFunc(func)
+		for (aec, redundant, max_count) in aecs:
+			info.addAec(aec, redundant, max_count)
 
 
 # Information about a data-structure being traversed
@@ -1088,11 +2423,10 @@ class DataStructureTraversalInfo(object):
 		self.funcs = set()
 		self.traversals = defaultdict(AecTraversalInfo)
 
-	def addAecNode(self, aec_node):
-		aec = aec_node.aec
+	def addAec(self, aec, redundant, max_count):
 		aec_info = self.traversals[aec]
-		aec_info.redundant |= aec_node.redundant
-		aec_info.maxCount = max(aec_info.maxCount, aec_node.maxCount)
+		aec_info.redundant |= redundant
+		aec_info.maxCount = max(aec_info.maxCount, max_count)
 
 	def addFunc(self, func):
 		self.funcs.add(func)
@@ -1107,6 +2441,296 @@ class AecTraversalInfo(object):
 
 
 
+#################################
+# Profiling
+#################################
+
+# Global data
+phase_times = defaultdict(float)  # PHASE -> FLOAT   // Time spent in each phase of main (see end_phase)
+phase_clock = [time.time()]        # [FLOAT]          // When the current phase started
+profile_calls = defaultdict(int)   # FUNC_NAME -> INT
+profile_times = defaultdict(float) # FUNC_NAME -> FLOAT  // Cumulative time in calls, including nested calls
+profile_cache_stats = {'str_loc_cache': {'hits': 0, 'misses': 0}, 'str_sid_cache': {'hits': 0, 'misses': 0}}
+
+# Trace event kinds and the functions handling them
+event_handlers = {'R': 'handle_read', 'W': 'handle_write', 'G': 'handle_getfield', 'P': 'handle_putfield', 
+	'C': 'handle_call', 'E': 'handle_return', 'D': 'handle_declare'}
+
+# Functions timed with --stats, besides the event handlers
+profiled_functions = ['handle_row', 'handle_block', 'pop_sets', 'inherit_write_set', 'resolve_reads', 
+	'compute_traversals', 'compute_access_graph_edges', 'merge_access_graph', 'get_raec', 'aec_prefix']
+
+# Attributes the time since the end of the previous phase of main to a phase. This is cheap 
+# enough to be done without --stats.
+def end_phase(phase):
+	now = time.time()
+	phase_times[phase] += now - phase_clock[0]
+	phase_clock[0] = now
+
+# Replaces a module-level function by one which counts its calls and times them
+def profile_function(name):
+	fn = globals()[name]
+	def profiled(*args, **kwargs):
+		start = time.time()
+		try:
+			return fn(*args, **kwargs)
+		finally:
+			profile_times[name] += time.time() - start
+			profile_calls[name] += 1
+	globals()[name] = profiled
+
+# Replaces a cached string conversion by one which counts cache hits and misses
+def profile_cache(name, cache, key):
+	fn = globals()[name]
+	stats = profile_cache_stats[name + '_cache']
+	def profiled(*args, **kwargs):
+		if key(*args, **kwargs) in cache:
+			stats['hits'] += 1
+		else:
+			stats['misses'] += 1
+		return fn(*args, **kwargs)
+	globals()[name] = profiled
+
+# Instruments the analysis for --stats. Functions are replaced only then, so that profiling 
+# costs nothing otherwise. Calls in worker processes (see --workers and --shards) are not counted.
+def enable_profiling():
+	for name in event_handlers.values() + profiled_functions:
+		profile_function(name)
+	profile_cache('str_sid', str_sid_cache, lambda sid: str(sid))
+	# Only full representations of locations are cached
+	profile_cache('str_loc', str_loc_cache, lambda loc, full=True: loc if full else None)
+
+# Returns a hit-rate summary of cache statistics
+def cache_summary(stats):
+	lookups = stats['hits'] + stats['misses']
+	summary = dict(stats)
+	summary['hit_rate'] = float(stats['hits']) / lookups if lookups > 0 else None
+	return summary
+
+# Writes the profile collected with --stats to a JSON file, along with the liveness 
+# assumptions of stream_trace if the trace was streamed with a lookahead
+def write_stats(stats_json_file, total_time, lookahead):
+	events = {}
+	for (kind, name) in event_handlers.iteritems():
+		count = profile_calls[name]
+		seconds = profile_times[name]
+		events[kind] = {'count': count, 'time': seconds, 
+			'per_second': count / seconds if seconds > 0 else None}
+	functions = {}
+	for name in profiled_functions:
+		functions[name] = {'calls': profile_calls[name], 'time': profile_times[name]}
+	caches = {'raec_cache': cache_summary(raec_cache_stats)}
+	for (cache, stats) in profile_cache_stats.iteritems():
+		caches[cache] = cache_summary(stats)
+	stats = {
+		'total_time': total_time,
+		'events': line,
+		'events_per_second': line / phase_times['scan'] if phase_times['scan'] > 0 else None,
+		'phases': dict(phase_times),
+		'event_kinds': events,
+		'functions': functions,
+		'caches': caches,
+	}
+	if lookahead > 0:
+		stats['liveness'] = {'lookahead': lookahead, 'assumed_live': len(assumed_live)}
+	with open(stats_json_file, 'w') as stats_json:
+		json.dump(stats, stats_json, indent=2, sort_keys=True)
+
+
+#################################
+# Memory telemetry
+#################################
+
+# Global data
+memory_sampler = None  # MemorySampler, if enabled
+
+# Samples memory usage if the sampler is enabled and due
+def sample_memory():
+	if memory_sampler is not None and line >= memory_sampler.nextLine:
+		memory_sampler.sample()
+
+# Returns the resident set size of the process in KB, or its peak if the current size is unavailable
+def process_rss():
+	try:
+		with open('/proc/self/status') as status:
+			for status_line in status:
+				if status_line.startswith('VmRSS:'):
+					return int(status_line.split()[1])
+	except IOError:
+		pass
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else None
+
+# Returns the total number of reads in a stack of read sets (counting shared reads once per segment)
+def read_sets_size():
+	return sum(read_set_shape(read_set)[0] for read_set in read_sets_stack)
+
+# Sizes of the analysis data structures recorded by MemorySampler, as functions of no arguments
+memory_columns = [
+	('last_reads', lambda: len(last_reads)),
+	('last_write_locs', lambda: len(last_write_locs)),
+	('root_objects', lambda: len(root_objects)),
+	('frames', lambda: len(fid_frame_map)),
+	('func_frames', lambda: len(func_frames_map)),
+	('read_sets', read_sets_size),
+	('write_sets', lambda: sum(len(ws) for ws in write_sets_stack)),
+	('raec_cache', lambda: sum(len(cache) for cache in raec_cache.itervalues()) + len(raec_cache_old)),
+	('aec_prefix_cache', lambda: sum(len(cache) for cache in aec_prefix_cache.itervalues())),
+	('aec_trie', lambda: len(aec_trie_tab)),
+	('aecs', lambda: len(aec_tab)),
+	('raec_read_map', lambda: sum(len(aecs) for aecs in raec_read_map.itervalues())),
+	('raec_write_map', lambda: sum(len(aecs) for aecs in raec_write_map.itervalues())),
+	('pending_analyses', lambda: len(analysis_batch) + len(pending_analyses)),
+	('access_graph_nodes', lambda: sum(len(nodes) for (nodes, roots) in func_ag_map.itervalues())),
+]
+
+# Records the sizes of the analysis data structures and the RSS every interval lines of the trace
+# as rows of a CSV file, and the number of nodes in the access graph of each function whenever it 
+# changes as rows of another CSV file. Rows are flushed as they are written, so that the time series
+# survives the process being killed.
+class MemorySampler(object):
+	__slots__ = ['interval', 'nextLine', 'startTime', 'csvFile', 'csvWriter', 'agCsvFile', 'agCsvWriter', 'agSizes']
+	def __init__(self, csv_file_name, interval):
+		self.interval = interval
+		self.nextLine = line + interval
+		self.startTime = time.time()
+		self.csvFile = open(csv_file_name, 'wb')
+		self.csvWriter = csv.writer(self.csvFile)
+		self.csvWriter.writerow(['line', 'time', 'rss_kb'] + [name for (name, _) in memory_columns])
+		(base, ext) = os.path.splitext(csv_file_name)
+		self.agCsvFile = open(base + '_ag' + ext, 'wb')
+		self.agCsvWriter = csv.writer(self.agCsvFile)
+		self.agCsvWriter.writerow(['line', 'func', 'nodes'])
+		self.agSizes = {}  # FUNC -> INT
+
+	def sample(self):
+		self.csvWriter.writerow([line, "%.3f" % (time.time() - self.startTime), process_rss()] + \
+			[size() for (_, size) in memory_columns])
+		self.csvFile.flush()
+		for (func, (nodes, roots)) in func_ag_map.iteritems():
+			if self.agSizes.get(func) != len(nodes):
+				self.agSizes[func] = len(nodes)
+				self.agCsvWriter.writerow([line, str_func(func), len(nodes)])
+		self.agCsvFile.flush()
+		self.nextLine = line + self.interval
+
+	def close(self):
+		self.csvFile.close()
+		self.agCsvFile.close()
+
+
+#################################
+# Exporting results to SQLite
+#################################
+
+# Tables of the exported results, where a FUNC or LOC is stored as its SID:IID string
+sqlite_schema = [
+	# Source locations of functions and AECs
+	"""CREATE TABLE locations (loc TEXT PRIMARY KEY, file TEXT, line_start INTEGER, 
+		col_start INTEGER, line_end INTEGER, col_end INTEGER)""",
+	# Analyzed functions and statistics of their access graphs
+	"""CREATE TABLE functions (func TEXT PRIMARY KEY, file TEXT, nodes INTEGER, edges INTEGER, 
+		traversal_points INTEGER, redundant_traversal_points INTEGER, max_count INTEGER)""",
+	# Locations of each AEC, most recent first (as in traversals.out)
+	"""CREATE TABLE aec_locations (aec INTEGER, idx INTEGER, loc TEXT, PRIMARY KEY (aec, idx))""",
+	# Traversed data structures, by access path
+	"""CREATE TABLE data_structures (id INTEGER PRIMARY KEY, path TEXT UNIQUE, 
+		sampled_traversal INTEGER, sampled_redundancy INTEGER)""",
+	"""CREATE TABLE data_structure_functions (data_structure INTEGER, func TEXT)""",
+	# Traversal points (RAECs) of each data structure
+	"""CREATE TABLE traversal_points (data_structure INTEGER, raec INTEGER, func TEXT, file TEXT, 
+		redundant INTEGER, max_count INTEGER, PRIMARY KEY (data_structure, raec))""",
+	# AECs of the reads at each RAEC, and of the writes of the values read (not truncated)
+	"""CREATE TABLE raec_reads (raec INTEGER, aec INTEGER)""",
+	"""CREATE TABLE raec_writes (raec INTEGER, aec INTEGER)""",
+	# Edges of the access graphs, between nodes named as in the DOT files
+	"""CREATE TABLE access_graph_edges (func TEXT, src TEXT, dst TEXT, dst_aec INTEGER, label TEXT)""",
+	# Indexes for querying by file, by function, by redundancy and by max count
+	"""CREATE INDEX locations_file ON locations (file)""",
+	"""CREATE INDEX functions_file ON functions (file)""",
+	"""CREATE INDEX data_structure_functions_func ON data_structure_functions (func)""",
+	"""CREATE INDEX traversal_points_func ON traversal_points (func)""",
+	"""CREATE INDEX traversal_points_file ON traversal_points (file)""",
+	"""CREATE INDEX traversal_points_redundant ON traversal_points (redundant, max_count)""",
+	"""CREATE INDEX traversal_points_max_count ON traversal_points (max_count)""",
+	"""CREATE INDEX raec_reads_raec ON raec_reads (raec)""",
+	"""CREATE INDEX raec_writes_raec ON raec_writes (raec)""",
+	"""CREATE INDEX access_graph_edges_func ON access_graph_edges (func)""",
+]
+
+# Returns the position of a location as a tuple, or NULLs if it is not in the source map, 
+# in which case it is added to the missing locations
+def loc_position(loc, missing):
+	try:
+		return tuple(source_map.position(loc[0], loc[1]))
+	except KeyError:
+		missing.append(loc)
+		return (None, None, None, None)
+
+# Exports the results of the analysis to a new SQLite database
+def export_sqlite(db_file, traversal_infos, random_t_samples, random_r_samples):
+	if os.path.exists(db_file):
+		os.remove(db_file)
+	db = sqlite3.connect(db_file)
+	try:
+		for statement in sqlite_schema:
+			db.execute(statement)
+		locs = set()
+
+		# Functions and their access graphs
+		func_rows = []
+		edge_rows = []
+		for (func, (nodes, roots)) in func_ag_map.iteritems():
+			locs.add(func)
+			num_edges = 0
+			for node in nodes.itervalues():
+				for (dst_idx, label) in node.iterEdges():
+					dst_node = nodes[dst_idx]
+					dst_aec = dst_node.aec if isinstance(dst_node, AccessGraphAecNode) else None
+					edge_rows.append((str_func(func), node.getName(), dst_node.getName(), dst_aec, str_edge_label(label)))
+					num_edges += 1
+			aec_nodes = [node for node in nodes.itervalues() if isinstance(node, AccessGraphAecNode)]
+			func_rows.append((str_func(func), str_sid(func[0]), len(nodes), num_edges, 
+				sum(1 for node in aec_nodes if node.traversed), sum(1 for node in aec_nodes if node.redundant), 
+				max([node.maxCount for node in aec_nodes] or [0])))
+		db.executemany("INSERT INTO functions VALUES (?, ?, ?, ?, ?, ?, ?)", func_rows)
+		db.executemany("INSERT INTO access_graph_edges VALUES (?, ?, ?, ?, ?)", edge_rows)
+
+		# Traversed data structures and their traversal points
+		ds_id = 0
+		for (path, ds_info) in traversal_infos.iteritems():
+			ds_id += 1
+			db.execute("INSERT INTO data_structures VALUES (?, ?, ?, ?)", 
+				(ds_id, path, path in random_t_samples, path in random_r_samples))
+			db.executemany("INSERT INTO data_structure_functions VALUES (?, ?)", 
+				[(ds_id, str_func(func)) for func in ds_info.funcs])
+			db.executemany("INSERT INTO traversal_points VALUES (?, ?, ?, ?, ?, ?)", 
+				[(ds_id, raec, str_func(raec_func_map[raec]), str_sid(aec_top(raec)[0]), 
+				raec_info.redundant, raec_info.maxCount) for (raec, raec_info) in ds_info.traversals.iteritems()])
+
+		# Read and write AECs of RAECs
+		db.executemany("INSERT INTO raec_reads VALUES (?, ?)", 
+			((raec, aec) for (raec, aecs) in raec_read_map.iteritems() for aec in aecs))
+		db.executemany("INSERT INTO raec_writes VALUES (?, ?)", 
+			((raec, aec) for (raec, aecs) in raec_write_map.iteritems() for aec in aecs))
+
+		# AECs and the locations they consist of
+		aec_rows = []
+		for aec in xrange(len(aec_tab)):
+			for (idx, loc) in enumerate(expand_aec(aec)):
+				locs.add(loc)
+				aec_rows.append((aec, idx, str_func(loc)))
+		db.executemany("INSERT INTO aec_locations VALUES (?, ?, ?)", aec_rows)
+		missing = []
+		db.executemany("INSERT INTO locations VALUES (?, ?, ?, ?, ?, ?)", 
+			[(str_func(loc), str_sid(loc[0])) + loc_position(loc, missing) for loc in locs])
+		db.commit()
+		if len(missing) > 0:
+			sys.stderr.write("Warning: " + str(len(missing)) + " locations are missing from the source map " + \
+				"and have no position in " + db_file + ": " + str_list_truncate(map(str_func, sorted(missing)), 5) + "\n")
+	finally:
+		db.close()
+
+
 # Run the program driver
 if __name__ == "__main__":
 	main()
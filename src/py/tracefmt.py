@@ -0,0 +1,517 @@
+"""
+ Copyright (c) 2016, University of California, Berkeley
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without
+ modification, are permitted provided that the following conditions are
+ met:
+
+ 1. Redistributions of source code must retain the above copyright
+ notice, this list of conditions and the following disclaimer.
+
+ 2. Redistributions in binary form must reproduce the above copyright
+ notice, this list of conditions and the following disclaimer in the
+ documentation and/or other materials provided with the distribution.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+ HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+ SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+ LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+ DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+ THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import argparse
+import bz2
+import csv
+import gzip
+import math
+import mmap
+import os
+import Queue
+import struct
+import threading
+from collections import namedtuple
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+try:
+	import lzma
+except ImportError:
+	try:
+		from backports import lzma
+	except ImportError:
+		lzma = None
+
+# Compact binary trace format, as written by BinaryTraceWriter in src/js/logging.js
+#
+# The file starts with MAGIC followed by a sequence of blocks. Each block has a header
+# (size of the block body in bytes, number of events) followed by the events of the block
+# in columnar form:
+#   - the codes of the event kinds and value types (NO_VALUE if the event has no value), 
+#     one byte each (see event_codes)
+#   - the encodings of the NUM_COLUMNS columns below, one byte each
+#   - MAX_FIELDS integer columns, where column j holds the j-th integer field of every event
+#     that has at least j+1 integer fields (see int_fields)
+#   - an integer column of the values of events whose value is an object, string or undefined
+#   - a column of the values of events whose value is a primitive, which is a float64 column 
+#     unless all of them are integers
+# All numbers are little-endian. The encoding of a column is the width in bytes of its values
+# (1, 2 or 4 for signed integers, 8 for float64), chosen as the smallest width that fits all 
+# of them in the block, plus DELTA if the column holds the differences between consecutive 
+# values (starting from 0), which is used if they fit a smaller width than the values, as for
+# the increasing IDs of objects and frames.
+
+MAGIC = 'TRAVBIN2'
+MAGIC_PREFIX = 'TRAVBIN'
+NO_VALUE = '-'
+MAX_FIELDS = 6
+MAX_EVENTS = 1 << 16
+NUM_COLUMNS = MAX_FIELDS + 2
+DELTA = 0x10
+WIDTH_MASK = 0x0f
+
+block_header = struct.Struct('<II')
+
+# struct formats and NumPy types of the values of columns, by width
+column_formats = {1: 'b', 2: 'h', 4: 'i', 8: 'd'}
+column_dtypes = {1: '<i1', 2: '<i2', 4: '<i4', 8: '<f8'}
+# Smallest value of the signed integers of each width
+int_ranges = [(1, -1 << 7), (2, -1 << 15), (4, -1 << 31)]
+
+# Number of int32 fields preceding the value (if any) for each event kind
+int_fields = {'R': 4, 'W': 4, 'D': 4, 'G': 5, 'P': 5, 'C': 6, 'E': 2}
+
+# Event kinds whose last two CSV columns are a value and its type
+valued_kinds = set(['R', 'W', 'D', 'G', 'P', 'E'])
+
+# Numeric encodings of non-numeric primitives
+primitive_values = {'true': 1.0, 'false': 0.0, 'null': 0.0}
+
+# Codes of the pairs of an event kind and a value type
+value_types = ['O', 'S', 'U', 'P', NO_VALUE]
+event_codes = dict(((kind, type), i * len(value_types) + j) 
+	for (i, kind) in enumerate(sorted(int_fields)) for (j, type) in enumerate(value_types))
+# Translation tables of event codes to kinds and to types
+code_kinds = ['\0'] * 256
+code_types = ['\0'] * 256
+for ((kind, type), code) in event_codes.iteritems():
+	code_kinds[code] = kind
+	code_types[code] = type
+code_kinds = ''.join(code_kinds)
+code_types = ''.join(code_types)
+
+# Number of int32 fields for each event kind, indexed by the kind's byte value
+if numpy is not None:
+	kind_num_fields = numpy.zeros(256, numpy.int8)
+	for kind, n in int_fields.iteritems():
+		kind_num_fields[ord(kind)] = n
+	code_kind_bytes = numpy.frombuffer(code_kinds, numpy.uint8)
+	code_type_bytes = numpy.frombuffer(code_types, numpy.uint8)
+
+# A decoded block of events with row-aligned columns:
+#   kinds  : STR of event kinds
+#   types  : STR of value types
+#   fields : [[INT]], where fields[j][i] is the j-th integer field of event i (or 0)
+#   values : [INT|FLOAT], the value of each event (or 0)
+Block = namedtuple('Block', ['kinds', 'types', 'fields', 'values'])
+
+
+# Returns whether a trace file is in the binary format
+def is_binary_trace(file_name):
+	codec = trace_codec(file_name)
+	with (open(file_name, 'rb') if codec is None else open_codec(file_name, codec)) as f:
+		magic = f.read(len(MAGIC))
+	if magic.startswith(MAGIC_PREFIX) and magic != MAGIC:
+		raise ValueError(file_name + " is in an older binary trace format, convert its CSV trace again")
+	return magic == MAGIC
+
+
+# Compressed traces (in either format) are recognized by the magic numbers of their codecs
+codec_magics = [('gzip', '\x1f\x8b'), ('bz2', 'BZh'), ('xz', '\xfd7zXZ\x00')]
+
+# Returns the codec with which a trace file is compressed, or None if it is not compressed. 
+# Named pipes are never compressed, as reading their first bytes would consume them.
+def trace_codec(file_name):
+	if not os.path.isfile(file_name):
+		return None
+	with open(file_name, 'rb') as f:
+		head = f.read(max(len(magic) for (_, magic) in codec_magics))
+	for (codec, magic) in codec_magics:
+		if head.startswith(magic):
+			return codec
+	return None
+
+def is_compressed_trace(file_name):
+	return trace_codec(file_name) is not None
+
+# Opens a compressed file for reading its decompressed content
+def open_codec(file_name, codec):
+	if codec == 'gzip':
+		return gzip.GzipFile(file_name, 'rb')
+	elif codec == 'bz2':
+		return bz2.BZ2File(file_name, 'rb')
+	elif lzma is not None:
+		return lzma.LZMAFile(file_name, 'rb')
+	else:
+		raise RuntimeError("Reading " + file_name + " requires the lzma module (backports.lzma on Python 2)")
+
+# Opens a trace file for reading it sequentially, decompressing it in the background if it is compressed
+def open_trace(file_name):
+	codec = trace_codec(file_name)
+	if codec is None:
+		return open(file_name, 'rb')
+	return BackgroundReader(open_codec(file_name, codec))
+
+# Size of the chunks decompressed at a time, and number of chunks decompressed ahead of the reader
+decompress_chunk_size = 1 << 20
+decompress_ahead_chunks = 16
+
+# Sequential reader of a decompressed stream, which is decompressed by a thread into a bounded 
+# queue of chunks. The codecs decompress without holding the GIL, so that decompression overlaps 
+# with the analysis of the chunks already read.
+class BackgroundReader(object):
+	__slots__ = ['stream', 'chunks', 'thread', 'stopped', 'done', 'buffer', 'pos']
+	def __init__(self, stream):
+		self.stream = stream
+		self.chunks = Queue.Queue(decompress_ahead_chunks)
+		self.stopped = False  # Set by the reader to stop the thread
+		self.done = False     # Set once the reader has reached the end of the stream
+		self.buffer = ''
+		self.pos = 0
+		self.thread = threading.Thread(target=self.decompress)
+		self.thread.daemon = True
+		self.thread.start()
+
+	# Runs in the thread, ending the queue with an empty chunk or with the error that stopped it
+	def decompress(self):
+		try:
+			while not self.stopped:
+				chunk = self.stream.read(decompress_chunk_size)
+				self.chunks.put(chunk)
+				if len(chunk) == 0:
+					return
+		except Exception as e:
+			self.chunks.put(e)
+
+	# Returns the next decompressed chunk, or an empty string at the end of the stream
+	def nextChunk(self):
+		if self.done:
+			return ''
+		chunk = self.chunks.get()
+		if isinstance(chunk, Exception):
+			self.done = True
+			raise chunk
+		if len(chunk) == 0:
+			self.done = True
+		return chunk
+
+	# Reads size bytes, or fewer at the end of the stream
+	def read(self, size):
+		parts = []
+		while size > 0:
+			if self.pos >= len(self.buffer):
+				self.buffer = self.nextChunk()
+				self.pos = 0
+				if len(self.buffer) == 0:
+					break
+			part = self.buffer[self.pos:self.pos+size]
+			self.pos += len(part)
+			size -= len(part)
+			parts.append(part)
+		return ''.join(parts)
+
+	# Iterates over the remaining lines, as for a file
+	def __iter__(self):
+		rest = self.buffer[self.pos:]
+		self.buffer = ''
+		self.pos = 0
+		while True:
+			chunk = self.nextChunk()
+			if len(chunk) == 0:
+				break
+			lines = (rest + chunk).split('\n')
+			rest = lines.pop()
+			for l in lines:
+				yield l + '\n'
+		if len(rest) > 0:
+			yield rest
+
+	def close(self):
+		# Unblock the thread if it is waiting for room in the queue
+		self.stopped = True
+		while self.thread.is_alive():
+			try:
+				self.chunks.get(timeout=0.1)
+			except Queue.Empty:
+				pass
+		self.stream.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+# Splits a binary trace into byte ranges [START, END) of roughly the given size which end on block boundaries
+def split_blocks(file_name, size):
+	chunks = []
+	with open(file_name, 'rb') as f:
+		start = len(MAGIC)
+		pos = start
+		f.seek(pos)
+		while True:
+			header = f.read(block_header.size)
+			if len(header) < block_header.size:
+				break
+			(body_size, _) = block_header.unpack(header)
+			pos += block_header.size + body_size
+			f.seek(pos)
+			if pos - start >= size:
+				chunks.append((start, pos))
+				start = pos
+		if pos > start:
+			chunks.append((start, pos))
+	return chunks
+
+# Iterates over the blocks of a binary trace between byte offsets start and end, using
+# the given function to decode each block from the memory-mapped file. If with_offsets
+# is set then yields (START, END, BLOCK) with the byte offsets where the block starts and ends.
+# Compressed traces can only be read as a whole, and have no byte offsets.
+def iter_mapped_blocks(file_name, decode, start, end, with_offsets=False):
+	if is_compressed_trace(file_name):
+		if start != len(MAGIC) or end is not None:
+			raise ValueError("Compressed trace " + file_name + " can only be read from its start")
+		for block in iter_stream_blocks(file_name, decode):
+			yield (None, None, block) if with_offsets else block
+		return
+	with open(file_name, 'rb') as f:
+		mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			if end is None:
+				end = len(mm)
+			pos = start
+			while pos < end:
+				(body_size, count) = block_header.unpack_from(mm, pos)
+				block_start = pos
+				pos += block_header.size
+				if with_offsets:
+					yield block_start, pos + body_size, decode(mm, pos, count)
+				else:
+					yield decode(mm, pos, count)
+				pos += body_size
+		finally:
+			mm.close()
+
+# Iterates over the blocks of a (compressed) binary trace read sequentially, decoding each 
+# block from its body
+def iter_stream_blocks(file_name, decode):
+	with open_trace(file_name) as f:
+		if f.read(len(MAGIC)) != MAGIC:
+			raise ValueError(file_name + " is not a binary trace")
+		while True:
+			header = f.read(block_header.size)
+			if len(header) < block_header.size:
+				break
+			(body_size, count) = block_header.unpack(header)
+			yield decode(f.read(body_size), 0, count)
+
+# Returns the lengths of the field columns and of the int/float value columns of a block
+def column_lengths(kinds, types):
+	count = len(kinds)
+	kind_counts = [(int_fields[kind], kinds.count(kind)) for kind in int_fields]
+	field_lengths = [sum(n for (num_ints, n) in kind_counts if num_ints > j) for j in range(MAX_FIELDS)]
+	num_prims = types.count('P')
+	num_ints = count - num_prims - types.count(NO_VALUE)
+	return field_lengths, num_ints, num_prims
+
+# Decodes a block into a Block of row-aligned lists
+def decode_block(mm, pos, count):
+	if numpy is not None:
+		(kinds, types, fields, values) = decode_block_arrays(mm, pos, count)
+		return Block(kinds.tostring(), types.tostring(), [f.tolist() for f in fields], values.tolist())
+	codes = mm[pos:pos+count]
+	kinds = codes.translate(code_kinds)
+	types = codes.translate(code_types)
+	pos += count
+	encodings = map(ord, mm[pos:pos+NUM_COLUMNS])
+	pos += NUM_COLUMNS
+	field_lengths, num_ints, num_prims = column_lengths(kinds, types)
+	columns = []
+	for j in range(MAX_FIELDS):
+		(column, pos) = decode_column(mm, pos, field_lengths[j], encodings[j])
+		columns.append(column)
+	(int_values, pos) = decode_column(mm, pos, num_ints, encodings[MAX_FIELDS])
+	(prim_values, pos) = decode_column(mm, pos, num_prims, encodings[MAX_FIELDS+1])
+	# Align columns to rows
+	fields = [[0] * count for j in range(MAX_FIELDS)]
+	values = [0] * count
+	positions = [0] * MAX_FIELDS
+	int_pos = 0
+	prim_pos = 0
+	for i in xrange(count):
+		for j in range(int_fields[kinds[i]]):
+			fields[j][i] = columns[j][positions[j]]
+			positions[j] += 1
+		type = types[i]
+		if type == 'P':
+			values[i] = float(prim_values[prim_pos])
+			prim_pos += 1
+		elif type != NO_VALUE:
+			values[i] = int_values[int_pos]
+			int_pos += 1
+	return Block(kinds, types, fields, values)
+
+# Decodes a column of n values at pos, returning them with the position after the column
+def decode_column(mm, pos, n, encoding):
+	width = encoding & WIDTH_MASK
+	values = struct.unpack_from('<%d%s' % (n, column_formats[width]), mm, pos)
+	if encoding & DELTA:
+		total = 0
+		deltas = values
+		values = []
+		for delta in deltas:
+			total += delta
+			values.append(total)
+	return values, pos + n * width
+
+# Decodes a column of n values at pos into a NumPy array, returning it with the position after the column
+def decode_column_array(mm, pos, n, encoding):
+	width = encoding & WIDTH_MASK
+	column = numpy.frombuffer(mm, column_dtypes[width], n, pos)
+	if encoding & DELTA:
+		column = numpy.cumsum(column, dtype=numpy.int64)
+	return column, pos + n * width
+
+# Decodes a block into row-aligned NumPy arrays (KINDS, TYPES, FIELDS, VALUES), where
+# kinds and types are uint8 arrays, fields is a list of int32 arrays and values is an
+# object array of ints and floats (or None if with_values is False)
+def decode_block_arrays(mm, pos, count, with_values=True):
+	codes = numpy.frombuffer(mm, numpy.uint8, count, pos)
+	kinds = code_kind_bytes[codes]
+	types = code_type_bytes[codes]
+	pos += count
+	encodings = map(ord, mm[pos:pos+NUM_COLUMNS])
+	pos += NUM_COLUMNS
+	event_fields = kind_num_fields[kinds]
+	fields = []
+	for j in range(MAX_FIELDS):
+		has_field = event_fields > j
+		field = numpy.zeros(count, numpy.int32)
+		(field[has_field], pos) = decode_column_array(mm, pos, numpy.count_nonzero(has_field), encodings[j])
+		fields.append(field)
+	if not with_values:
+		return kinds, types, fields, None
+	is_prim = types == ord('P')
+	is_int = ~is_prim & (types != ord(NO_VALUE))
+	values = numpy.zeros(count, object)
+	(int_values, pos) = decode_column_array(mm, pos, numpy.count_nonzero(is_int), encodings[MAX_FIELDS])
+	values[is_int] = int_values.tolist()
+	(prim_values, pos) = decode_column_array(mm, pos, numpy.count_nonzero(is_prim), encodings[MAX_FIELDS+1])
+	values[is_prim] = prim_values.astype(numpy.float64).tolist()
+	return kinds, types, fields, values
+
+# Iterates over the decoded Blocks of a binary trace between byte offsets start and end
+def iter_blocks(file_name, start=len(MAGIC), end=None):
+	return iter_mapped_blocks(file_name, decode_block, start, end)
+
+# Iterates over (START, END, BLOCK) for the decoded Blocks of a binary trace between byte
+# offsets start and end, where START and END are the byte offsets of the block
+def iter_blocks_with_offsets(file_name, start=len(MAGIC), end=None):
+	return iter_mapped_blocks(file_name, decode_block, start, end, with_offsets=True)
+
+# Iterates over the blocks of a binary trace between byte offsets start and end, 
+# decoded into NumPy arrays (requires numpy)
+def iter_block_arrays(file_name, start=len(MAGIC), end=None, with_values=True):
+	decode = lambda mm, pos, count: decode_block_arrays(mm, pos, count, with_values)
+	return iter_mapped_blocks(file_name, decode, start, end)
+
+# Encodes a block of trace rows (as in the CSV format) into its binary representation
+def encode_block(rows):
+	codes = []
+	columns = [[] for j in range(MAX_FIELDS)]
+	int_values = []
+	prim_values = []
+	for row in rows:
+		kind = row[0]
+		n = int_fields[kind]
+		for j in range(n):
+			columns[j].append(int(row[j+1]))
+		if kind in valued_kinds:
+			value = row[n+1]
+			type = row[n+2]
+			if type == 'P':
+				prim_values.append(primitive_values[value] if value in primitive_values else float(value))
+			else:
+				int_values.append(int(value))
+		else:
+			type = NO_VALUE
+		codes.append(chr(event_codes[(kind, type)]))
+	encoded = [encode_column(column) for column in columns]
+	encoded.append(encode_column(int_values))
+	encoded.append(encode_column(prim_values, floats=True))
+	body = [''.join(codes), ''.join(chr(encoding) for (encoding, _) in encoded)]
+	body.extend(data for (_, data) in encoded)
+	body = ''.join(body)
+	return block_header.pack(len(body), len(rows)) + body
+
+# Returns the smallest width of the signed integers that fits a list of integers, or None if none does
+def int_width(values):
+	if len(values) == 0:
+		return 1
+	(lo, hi) = (min(values), max(values))
+	for (width, low) in int_ranges:
+		if lo >= low and hi < -low:
+			return width
+	return None
+
+# Returns whether a float is an integer that can be stored in an int32 column without loss
+def is_int_float(value):
+	return not math.isinf(value) and not math.isnan(value) and value.is_integer() and \
+		-(1 << 31) <= value < (1 << 31) and not (value == 0 and math.copysign(1, value) < 0)
+
+# Encodes a column of integers, or of floats, with the smallest encoding and returns (ENCODING, DATA)
+def encode_column(values, floats=False):
+	if floats and not all(is_int_float(value) for value in values):
+		return 8, struct.pack('<%dd' % len(values), *values)
+	values = [int(value) for value in values]
+	width = int_width(values)
+	if width is None:
+		raise ValueError("Trace field out of int32 range: " + str(next(value for value in values if not -(1 << 31) <= value < (1 << 31))))
+	deltas = [value - prev for (prev, value) in zip([0] + values, values)]
+	delta_width = int_width(deltas)
+	if delta_width is not None and delta_width < width:
+		return DELTA | delta_width, struct.pack('<%d%s' % (len(deltas), column_formats[delta_width]), *deltas)
+	return width, struct.pack('<%d%s' % (len(values), column_formats[width]), *values)
+
+# Converts a CSV trace into a binary trace
+def convert_csv_trace(csv_file_name, bin_file_name):
+	with open_trace(csv_file_name) as csv_file, open(bin_file_name, 'wb') as bin_file:
+		bin_file.write(MAGIC)
+		rows = []
+		for row in csv.reader(csv_file):
+			rows.append(row)
+			if len(rows) == MAX_EVENTS:
+				bin_file.write(encode_block(rows))
+				rows = []
+		if len(rows) > 0:
+			bin_file.write(encode_block(rows))
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Convert a CSV read-write ' 
+		'trace into the compact binary format.')
+	parser.add_argument('trace_csv', type=str,
+		help="Input CSV trace file (e.g. .travioli/trace.csv)")
+	parser.add_argument('trace_bin', type=str,
+		help="Output binary trace file (e.g. .travioli/trace.bin)")
+	args = parser.parse_args()
+	convert_csv_trace(args.trace_csv, args.trace_bin)